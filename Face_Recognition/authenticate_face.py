@@ -1,61 +1,46 @@
 import os
-os.environ["TF_ENABLE_ONEDNN_OPTS"] = "0"
-os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
-
-# Disable GPU to avoid libdevice JIT errors
-os.environ["CUDA_VISIBLE_DEVICES"] = "-1"
-
-
 import cv2
 import numpy as np
-import tensorflow as tf
 import json
-import warnings
+import time
 
-warnings.filterwarnings("ignore", category=UserWarning, module="tensorflow.lite.python.interpreter")
+from face_detector import detect_faces as _detect_faces
+from face_gallery import get_gallery
+from face_matcher import FaceMatcher
+from inference_scheduler import get_scheduler
 
-# Load FaceNet model
-interpreter = tf.lite.Interpreter(model_path="mobilefacenet.tflite")
-interpreter.allocate_tensors()
-input_details = interpreter.get_input_details()
-output_details = interpreter.get_output_details()
+# Seconds a request waits for the shared inference worker
+INFERENCE_TIMEOUT = float(os.getenv("FACE_INFERENCE_TIMEOUT", "30"))
+# Most faces identified per image in multi-face mode (largest first)
+MAX_FACES = int(os.getenv("FACE_MAX_FACES", "20"))
 
-# Load Haarcascade for face detection
-try:
-    haarcascade_path = cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
-except AttributeError:
-    haarcascade_path = os.path.join(os.path.dirname(__file__), "haarcascade_frontalface_default.xml")
 
-face_cascade = cv2.CascadeClassifier(haarcascade_path)
+def extract_face_embedding(face):
+    """Embed a single BGR face crop (normalized for consistent cosine similarity)."""
+    return get_scheduler().embed([face], timeout=INFERENCE_TIMEOUT)[0]
 
 
-def preprocess_face(face):
-    face = tf.image.resize(face, [112, 112])
-    face = tf.cast(face, tf.float32) / 255.0
-    face = tf.expand_dims(face, axis=0)
-    return face
+def detect_faces(image):
+    """
+    Return every detected face box (x, y, w, h) in a BGR image, largest first.
 
+    Detection runs on a downscaled copy with the configured backend (see
+    face_detector); boxes are in full-resolution coordinates.
+    """
+    return _detect_faces(image)
 
-def extract_face_embedding(face):
-    face = preprocess_face(face)
-    face_numpy = face.numpy()
-    interpreter.set_tensor(input_details[0]['index'], face_numpy)
-    interpreter.invoke()
-    embedding = interpreter.get_tensor(output_details[0]['index']).flatten()
-    # Normalize embedding for consistent cosine similarity
-    norm = np.linalg.norm(embedding)
-    if norm == 0:
-        return embedding
-    embedding = embedding / norm
-    return embedding
+
+def extract_face_embeddings(image, boxes):
+    """Embed all face boxes of one image in a single batched model call."""
+    crops = [image[y:y + h, x:x + w] for x, y, w, h in boxes]
+    return get_scheduler().embed(crops, timeout=INFERENCE_TIMEOUT)
 
 
 def cosine_similarity(emb1, emb2):
-    emb1_tensor = tf.constant(emb1, dtype=tf.float32)
-    emb2_tensor = tf.constant(emb2, dtype=tf.float32)
-    dot_product = tf.reduce_sum(emb1_tensor * emb2_tensor)
-    norm_product = tf.norm(emb1_tensor) * tf.norm(emb2_tensor)
-    return (dot_product / norm_product).numpy()
+    emb1 = np.asarray(emb1, dtype=np.float32)
+    emb2 = np.asarray(emb2, dtype=np.float32)
+    norm_product = np.linalg.norm(emb1) * np.linalg.norm(emb2)
+    return float(np.dot(emb1, emb2) / norm_product)
 
 
 def load_face_database():
@@ -67,43 +52,152 @@ def load_face_database():
         return None
 
 
-def detect_and_extract_face_from_path(image_path):
+def _elapsed_ms(start):
+    return round((time.perf_counter() - start) * 1000, 2)
+
+
+def detect_and_extract_face(image, timings=None):
+    """
+    Detect the largest face in an already-decoded BGR image and embed it.
+
+    Returns (embedding, message). When a timings dict is given, detect_ms
+    and embed_ms are recorded in it.
+    """
+    if timings is None:
+        timings = {}
     try:
-        image = cv2.imread(image_path)
         if image is None:
-            return None, f"Could not read image file"
+            return None, "Could not read image file"
 
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        faces = face_cascade.detectMultiScale(gray, 1.3, 5)
+        start = time.perf_counter()
+        faces = detect_faces(image)
+        timings["detect_ms"] = _elapsed_ms(start)
 
         if len(faces) == 0:
             return None, "No face detected"
-        elif len(faces) > 1:
-            faces = sorted(faces, key=lambda x: x[2] * x[3], reverse=True)
 
         x, y, w, h = faces[0]
         face = image[y:y + h, x:x + w]
+        start = time.perf_counter()
         embedding = extract_face_embedding(face)
+        timings["embed_ms"] = _elapsed_ms(start)
         return embedding, "Success"
 
     except Exception as e:
         return None, f"Error: {str(e)}"
 
 
-def find_best_match(test_embedding, database, threshold=0.3):
-    """Compare test embedding with database embeddings and return best match."""
-    best_match = None
-    best_similarity = -1
+def decode_image_bytes(image_bytes):
+    """Decode an in-memory upload (bytes) into a BGR image without touching disk."""
+    return cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+def detect_and_extract_face_from_path(image_path, timings=None):
+    return detect_and_extract_face(cv2.imread(image_path), timings)
+
+
+def find_best_match(test_embedding, database, threshold=0.3, top_k=1):
+    """
+    Compare test embedding with database embeddings and return best match.
+
+    database may be a gallery snapshot (whose matcher is already normalized)
+    or a plain {name: embedding} dict.
+    """
+    matcher = getattr(database, "matcher", None)
+    if matcher is None:
+        matcher = FaceMatcher(list(database.keys()), list(database.values()))
+
+    result = matcher.match(test_embedding, top_k=top_k, threshold=threshold)
+    best_candidate = result["candidates"][0][0] if result["candidates"] else None
+    print(f"[DEBUG] Best match candidate: {best_candidate}, Similarity: {result['similarity']:.4f}")
+
+    return result["name"], result["similarity"]
+
+
+def authenticate_embedding(embedding, location="", timings=None):
+    """Match a precomputed embedding against the resident gallery."""
+    if timings is None:
+        timings = {}
+
+    database = get_gallery().snapshot()
+    if not len(database):
+        print("[ERROR] Face database not loaded or empty.")
+        return {"name": None, "location": location}
+
+    start = time.perf_counter()
+    match_name, similarity = find_best_match(embedding, database, threshold=0.3)
+    timings["match_ms"] = _elapsed_ms(start)
+    print(f"[DEBUG] Final match: {match_name}, Similarity: {similarity:.4f}")
+
+    return {"name": match_name, "location": location}
+
+
+def authenticate_image(image, location="", timings=None):
+    """
+    Identify the person in an already-decoded BGR image.
 
-    for name, stored_embedding in database.items():
-        similarity = cosine_similarity(test_embedding, stored_embedding)
-        if similarity > best_similarity:
-            best_similarity = similarity
-            best_match = name
+    Detection, embedding and matching each run exactly once; per-stage
+    timings are recorded in the optional timings dict.
+    """
+    try:
+        embedding, message = detect_and_extract_face(image, timings)
+        if embedding is None:
+            print(f"[ERROR] Face detection/embedding failed: {message}")
+            return {"name": None, "location": location}
+
+        return authenticate_embedding(embedding, location, timings)
+
+    except Exception as e:
+        print(f"[EXCEPTION] {str(e)}")
+        return {"name": None, "location": location}
 
-    print(f"[DEBUG] Best match candidate: {best_match}, Similarity: {best_similarity:.4f}")
 
-    return (best_match, best_similarity) if best_similarity > threshold else (None, best_similarity)
+def authenticate_image_faces(image, location="", timings=None, max_faces=MAX_FACES, threshold=0.3):
+    """
+    Identify every face in an already-decoded BGR image.
+
+    All detected faces (up to max_faces, largest first) are embedded in one
+    batched model call and matched against the gallery in one matrix
+    product. Returns {"faces": [{"bbox", "name", "score"}], "location"};
+    name is None for faces below threshold.
+    """
+    if timings is None:
+        timings = {}
+    try:
+        if image is None:
+            print("[ERROR] Could not read image file")
+            return {"faces": [], "location": location}
+
+        start = time.perf_counter()
+        boxes = detect_faces(image)[:max_faces]
+        timings["detect_ms"] = _elapsed_ms(start)
+        if not boxes:
+            print("[ERROR] Face detection failed: No face detected")
+            return {"faces": [], "location": location}
+
+        start = time.perf_counter()
+        embeddings = extract_face_embeddings(image, boxes)
+        timings["embed_ms"] = _elapsed_ms(start)
+
+        database = get_gallery().snapshot()
+        if not len(database):
+            print("[ERROR] Face database not loaded or empty.")
+            matches = [{"name": None, "similarity": -1.0} for _ in boxes]
+        else:
+            start = time.perf_counter()
+            matches = database.matcher.match_batch(embeddings, threshold=threshold)
+            timings["match_ms"] = _elapsed_ms(start)
+
+        faces = [
+            {"bbox": list(box), "name": match["name"], "score": round(float(match["similarity"]), 4)}
+            for box, match in zip(boxes, matches)
+        ]
+        print(f"[DEBUG] Matched {len(faces)} faces: {[face['name'] for face in faces]}")
+        return {"faces": faces, "location": location}
+
+    except Exception as e:
+        print(f"[EXCEPTION] {str(e)}")
+        return {"faces": [], "location": location}
 
 
 def authenticate_from_json(input_data):
@@ -123,20 +217,7 @@ def authenticate_from_json(input_data):
             print(f"[ERROR] Image path does not exist: {image_path}")
             return {"name": None, "location": location}
 
-        database = load_face_database()
-        if not database:
-            print("[ERROR] Face database not loaded or empty.")
-            return {"name": None, "location": location}
-
-        embedding, message = detect_and_extract_face_from_path(image_path)
-        if embedding is None:
-            print(f"[ERROR] Face detection/embedding failed: {message}")
-            return {"name": None, "location": location}
-
-        match_name, similarity = find_best_match(embedding, database, threshold=0.3)
-        print(f"[DEBUG] Final match: {match_name}, Similarity: {similarity:.4f}")
-
-        return {"name": match_name, "location": location}
+        return authenticate_image(cv2.imread(image_path), location)
 
     except Exception as e:
         print(f"[EXCEPTION] {str(e)}")
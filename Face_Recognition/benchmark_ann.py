@@ -0,0 +1,86 @@
+"""
+Recall-vs-exact benchmark for the IVF face index.
+
+Scales a face_database2.json-style gallery synthetically (each synthetic
+identity is a real embedding plus Gaussian noise) and compares IVF search
+at several nprobe settings against exact brute-force search.
+
+    python benchmark_ann.py --size 1000000 --queries 1000 --nprobe 1,4,8,16,32
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from face_index import IVFIndex
+from face_matcher import FaceMatcher, l2_normalize
+
+# Queries scored per exact-search call: each call materializes a
+# (chunk x gallery) score matrix, ~256 MB per 64 queries at 1M identities
+EXACT_CHUNK = 64
+
+
+def synthesize_gallery(seed_embeddings, size, noise, rng):
+    base = seed_embeddings[rng.integers(0, len(seed_embeddings), size)]
+    return l2_normalize(base + rng.normal(0.0, noise, base.shape).astype(np.float32))
+
+
+def exact_search(matcher, queries, top_k, chunk_size=EXACT_CHUNK):
+    """Brute-force top_k over query chunks so memory stays bounded at any gallery size."""
+    ids, scores = [], []
+    for start in range(0, len(queries), chunk_size):
+        chunk_ids, chunk_scores = matcher.search(queries[start:start + chunk_size], top_k=top_k, exact=True)
+        ids.append(chunk_ids)
+        scores.append(chunk_scores)
+    return np.concatenate(ids), np.concatenate(scores)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--database", default="face_database2.json")
+    parser.add_argument("--size", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--noise", type=float, default=0.05,
+                        help="Std-dev of per-identity noise around the seed embeddings")
+    parser.add_argument("--query-noise", type=float, default=0.02,
+                        help="Std-dev of noise between a query and its enrolled identity")
+    parser.add_argument("--n-lists", type=int, default=None)
+    parser.add_argument("--nprobe", default="1,4,8,16,32")
+    parser.add_argument("--top-k", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    with open(args.database, 'r') as f:
+        seeds = l2_normalize(np.asarray(list(json.load(f).values()), dtype=np.float32))
+
+    print(f"Synthesizing {args.size} identities from {len(seeds)} seed embeddings...")
+    gallery = synthesize_gallery(seeds, args.size, args.noise, rng)
+    truth = rng.integers(0, args.size, args.queries)
+    queries = l2_normalize(gallery[truth] + rng.normal(0.0, args.query_noise, (args.queries, gallery.shape[1])))
+
+    exact = FaceMatcher([str(i) for i in range(args.size)], gallery)
+    start = time.perf_counter()
+    exact_ids, _ = exact_search(exact, queries, args.top_k)
+    exact_ms = (time.perf_counter() - start) * 1000 / args.queries
+    print(f"Exact search: {exact_ms:.3f} ms/query")
+
+    start = time.perf_counter()
+    index = IVFIndex.build(gallery, n_lists=args.n_lists)
+    print(f"Built IVF index with {len(index.centroids)} lists in {time.perf_counter() - start:.1f}s")
+
+    print(f"{'nprobe':>6} {'ms/query':>9} {'recall@1':>9} {'recall@' + str(args.top_k):>10}")
+    for nprobe in (int(n) for n in args.nprobe.split(",")):
+        start = time.perf_counter()
+        ann_ids, _ = index.search(queries, top_k=args.top_k, nprobe=nprobe)
+        ann_ms = (time.perf_counter() - start) * 1000 / args.queries
+
+        recall_1 = np.mean(ann_ids[:, 0] == exact_ids[:, 0])
+        recall_k = np.mean([
+            len(set(a) & set(e)) / len(e) for a, e in zip(ann_ids, exact_ids)
+        ])
+        print(f"{nprobe:>6} {ann_ms:>9.3f} {recall_1:>9.3f} {recall_k:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
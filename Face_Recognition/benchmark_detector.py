@@ -0,0 +1,114 @@
+"""
+Compare face detector backends on latency and detection rate.
+
+Every backend runs at each detection resolution over the same images
+(e.g. the enrollment dataset); an image counts as detected when at least
+one face is found. Full-resolution Haar is the baseline the service used
+before detection was downscaled. "haar_eyes" additionally requires an eye
+inside each face box, using the bundled haarcascade_eye.xml.
+
+    python benchmark_detector.py --images new_reg --backends haar,haar_eyes,yunet --max-sides 0,1280,640,480
+"""
+import argparse
+import os
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from face_detector import HaarDetector, YuNetDetector, detect_faces, YUNET_MODEL_PATH
+
+BUNDLED_DIR = os.path.dirname(os.path.abspath(__file__))
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.webp', '.tif'}
+
+
+class EyeVerifiedHaarDetector(HaarDetector):
+    """Haar face cascade whose boxes must contain at least one Haar eye detection."""
+
+    name = "haar_eyes"
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.eye_cascade = cv2.CascadeClassifier(os.path.join(BUNDLED_DIR, "haarcascade_eye.xml"))
+
+    def detect(self, image):
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        boxes = []
+        for x, y, w, h in super().detect(image):
+            # Eyes sit in the upper part of the face box
+            if len(self.eye_cascade.detectMultiScale(gray[y:y + (3 * h) // 4, x:x + w], 1.1, 3)):
+                boxes.append((x, y, w, h))
+        return boxes
+
+
+def build_detector(backend, yunet_model):
+    bundled_cascade = os.path.join(BUNDLED_DIR, "haarcascade_frontalface_default.xml")
+    if backend == "haar":
+        return HaarDetector(cascade_path=bundled_cascade)
+    if backend == "haar_eyes":
+        return EyeVerifiedHaarDetector(cascade_path=bundled_cascade)
+    if backend == "yunet":
+        return YuNetDetector(model_path=yunet_model)
+    raise ValueError(f"Unknown backend '{backend}'")
+
+
+def load_images(path, limit):
+    paths = sorted(p for p in Path(path).rglob("*") if p.suffix.lower() in IMAGE_EXTENSIONS)[:limit]
+    images = []
+    for p in paths:
+        image = cv2.imread(str(p))
+        if image is not None:
+            images.append(image)
+    return images
+
+
+def run(detector, images, max_side):
+    detector.detect(images[0])  # warm-up
+    latencies = []
+    detected = 0
+    for image in images:
+        start = time.perf_counter()
+        boxes = detect_faces(image, detector=detector, max_side=max_side)
+        latencies.append((time.perf_counter() - start) * 1000)
+        detected += bool(boxes)
+    return {
+        "mean_ms": float(np.mean(latencies)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "detection_rate": detected / len(images),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--images", default="new_reg", help="Directory searched recursively for images")
+    parser.add_argument("--limit", type=int, default=500)
+    parser.add_argument("--backends", default="haar,haar_eyes,yunet")
+    parser.add_argument("--max-sides", default="0,1280,640,480",
+                        help="Comma-separated detection resolutions (0 = full resolution)")
+    parser.add_argument("--yunet-model", default=YUNET_MODEL_PATH)
+    args = parser.parse_args()
+
+    images = load_images(args.images, args.limit)
+    if not images:
+        print(f"❌ No images found under {args.images}")
+        return
+    megapixels = np.mean([image.shape[0] * image.shape[1] for image in images]) / 1e6
+    print(f"{len(images)} images, {megapixels:.1f} MP on average")
+
+    print(f"{'backend':>10} {'max side':>9} {'mean ms':>9} {'p95 ms':>8} {'detected':>9}")
+    for backend in args.backends.split(","):
+        try:
+            detector = build_detector(backend, args.yunet_model)
+        except Exception as e:
+            print(f"{backend:>10}  unavailable: {e}")
+            continue
+        for max_side in (int(v) for v in args.max_sides.split(",")):
+            result = run(detector, images, max_side)
+            label = str(max_side) if max_side else "full"
+            print(f"{backend:>10} {label:>9} {result['mean_ms']:>9.2f} {result['p95_ms']:>8.2f} "
+                  f"{result['detection_rate']:>8.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Compare interpreter pool layouts for concurrent face embedding.
+
+Each configuration is POOL_SIZE x NUM_THREADS (interpreters x intra-op
+threads). Concurrent client threads push single-face requests through an
+EmbeddingScheduler backed by that pool; throughput and latency
+percentiles are reported so the split between intra-op threads and
+inter-request parallelism can be chosen per node.
+
+    python benchmark_inference.py --configs 1x16,2x8,4x4,8x2,16x1 --clients 32
+"""
+import argparse
+import threading
+import time
+
+import numpy as np
+
+from face_model import InterpreterPool
+from inference_scheduler import EmbeddingScheduler
+
+
+def run_config(pool_size, num_threads, args, faces):
+    pool = InterpreterPool(size=pool_size, num_threads=num_threads, max_batch=args.max_batch,
+                           use_xnnpack=not args.no_xnnpack)
+    scheduler = EmbeddingScheduler(pool, max_batch=args.max_batch, max_wait_ms=args.max_wait_ms,
+                                   workers=pool.size)
+    scheduler.embed(faces[:1])  # warm-up
+
+    latencies = []
+    latencies_lock = threading.Lock()
+
+    def client(n):
+        local = []
+        for i in range(n):
+            start = time.perf_counter()
+            scheduler.embed([faces[i % len(faces)]])
+            local.append((time.perf_counter() - start) * 1000)
+        with latencies_lock:
+            latencies.extend(local)
+
+    per_client = args.requests // args.clients
+    threads = [threading.Thread(target=client, args=(per_client,)) for _ in range(args.clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    metrics = scheduler.metrics()
+    return {
+        "req_per_s": len(latencies) / elapsed,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "avg_batch": metrics["avg_batch_size"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--configs", default="1x16,2x8,4x4,8x2,16x1",
+                        help="Comma-separated POOL_SIZExNUM_THREADS settings")
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--max-batch", type=int, default=16)
+    parser.add_argument("--max-wait-ms", type=float, default=2.0)
+    parser.add_argument("--no-xnnpack", action="store_true")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    faces = [rng.integers(0, 256, (160, 160, 3), dtype=np.uint8) for _ in range(64)]
+
+    print(f"{'config':>8} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'batch':>6}")
+    for config in args.configs.split(","):
+        pool_size, num_threads = (int(v) for v in config.lower().split("x"))
+        result = run_config(pool_size, num_threads, args, faces)
+        print(f"{config:>8} {result['req_per_s']:>9.1f} {result['p50_ms']:>8.2f} "
+              f"{result['p99_ms']:>8.2f} {result['avg_batch']:>6.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Measure face-service cold start and per-worker memory for each TFLite backend.
+
+Every backend is timed in a fresh interpreter process: importing
+authenticate_face, building the interpreter pool and embedding one face.
+Peak RSS of that child process is reported alongside.
+
+    python benchmark_startup.py --backends tflite_runtime,tensorflow
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+CHILD_CODE = r"""
+import json, resource, time
+start = time.perf_counter()
+import numpy as np
+import authenticate_face
+import face_model
+imported = time.perf_counter()
+face_model.embed_faces([np.zeros((160, 160, 3), dtype=np.uint8)])
+ready = time.perf_counter()
+print(json.dumps({
+    "backend": face_model.TFLITE_BACKEND,
+    "import_s": imported - start,
+    "first_embedding_s": ready - start,
+    "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+}))
+"""
+
+
+def measure(backend):
+    env = dict(os.environ, FACE_TFLITE_BACKEND=backend)
+    proc = subprocess.run([sys.executable, "-c", CHILD_CODE], env=env, capture_output=True, text=True,
+                          cwd=os.path.dirname(os.path.abspath(__file__)))
+    if proc.returncode != 0:
+        return {"backend": backend, "error": proc.stderr.strip().splitlines()[-1] if proc.stderr else "failed"}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--backends", default="tflite_runtime,ai_edge_litert,tensorflow")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'backend':>16} {'import s':>9} {'ready s':>9} {'RSS MB':>8}")
+    for backend in args.backends.split(","):
+        results = [measure(backend) for _ in range(args.runs)]
+        errors = [r for r in results if "error" in r]
+        if errors:
+            print(f"{backend:>16}  unavailable: {errors[0]['error']}")
+            continue
+        best = min(results, key=lambda r: r["first_embedding_s"])
+        print(f"{backend:>16} {best['import_s']:>9.2f} {best['first_embedding_s']:>9.2f} {best['peak_rss_mb']:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
-import json
 import re
-import os
+
+from gallery_log import append_mutations, load_state, maybe_compact, rename_op
 
 def normalize_name(name):
     """Normalize name by removing IDs and cleaning up formatting"""
@@ -25,27 +25,25 @@ def normalize_name(name):
 
 def clean_face_database():
     db_path = "/media/ubuntu/Olive Green/Point514/Face_Recognition/face_database.json"
-    backup_path = "/media/ubuntu/Olive Green/Point514/Face_Recognition/face_database.json.backup"
     
     print("=" * 60)
     print("Face Database Name Cleanup")
     print("=" * 60)
     print()
     
-    # Load the database
+    # Load the database (snapshot plus any pending log records)
     try:
-        with open(db_path, 'r') as f:
-            face_db = json.load(f)
+        names, _, _ = load_state(db_path)
     except Exception as e:
         print(f"❌ Error loading database: {e}")
         return
     
-    print(f"Found {len(face_db)} entries in database")
+    print(f"Found {len(names)} entries in database")
     print()
     
     # Show what will be changed
     changes = []
-    for old_name in face_db.keys():
+    for old_name in names:
         new_name = normalize_name(old_name)
         if old_name != new_name:
             changes.append((old_name, new_name))
@@ -67,47 +65,25 @@ def clean_face_database():
         print("❌ Cancelled")
         return
     
-    # Create backup
-    print("\n📦 Creating backup...")
+    # Apply changes as rename records; the snapshot itself is left untouched,
+    # so no backup copy is needed
+    print("\n🔧 Applying changes...")
     try:
-        with open(backup_path, 'w') as f:
-            json.dump(face_db, f, indent=2)
-        print(f"✅ Backup saved to: {backup_path}")
+        append_mutations(db_path, [rename_op(old, new) for old, new in changes])
     except Exception as e:
-        print(f"❌ Failed to create backup: {e}")
+        print(f"\n❌ Failed to update database: {e}")
         return
+    for old_name, new_name in changes:
+        print(f"  ✓ Renamed: {old_name} → {new_name}")
+    print("\n✅ Database updated successfully!")
     
-    # Apply changes
-    print("\n🔧 Applying changes...")
-    new_db = {}
-    for old_name, embedding in face_db.items():
-        new_name = normalize_name(old_name)
-        new_db[new_name] = embedding
-        if old_name != new_name:
-            print(f"  ✓ Renamed: {old_name} → {new_name}")
-    
-    # Save updated database
-    try:
-        with open(db_path, 'w') as f:
-            json.dump(new_db, f, indent=2)
-        print("\n✅ Database updated successfully!")
-        print(f"\nOld database backed up to: {backup_path}")
-    except Exception as e:
-        print(f"\n❌ Failed to save updated database: {e}")
-        print("Restoring from backup...")
-        try:
-            with open(backup_path, 'r') as f:
-                backup_db = json.load(f)
-            with open(db_path, 'w') as f:
-                json.dump(backup_db, f, indent=2)
-            print("✅ Restored from backup")
-        except:
-            print("❌ Failed to restore backup!")
+    if maybe_compact(db_path):
+        print("📦 Compacted gallery log into a new snapshot")
     
     print("\n" + "=" * 60)
     print("Summary:")
-    print(f"  - Original entries: {len(face_db)}")
-    print(f"  - Updated entries: {len(new_db)}")
+    print(f"  - Original entries: {len(names)}")
+    print(f"  - Updated entries: {len(set(normalize_name(name) for name in names))}")
     print(f"  - Names changed: {len(changes)}")
     print("=" * 60)
 
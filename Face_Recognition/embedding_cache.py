@@ -0,0 +1,101 @@
+"""
+Persistent enrollment cache: image content hash -> face embedding.
+
+Entries are keyed by the SHA-256 of the image bytes together with a hash
+of the model file and a preprocessing key (PREPROCESS_VERSION plus the
+detector configuration), so swapping the model or changing
+detection/preprocessing invalidates them automatically. Images in
+which no face was found are cached too (with a NULL embedding), so they
+are not decoded again either.
+"""
+import os
+import time
+import sqlite3
+import hashlib
+
+import numpy as np
+
+from face_model import MODEL_PATH, PREPROCESS_VERSION
+
+EMBEDDING_CACHE_PATH = os.getenv("FACE_EMBEDDING_CACHE", "embedding_cache.sqlite")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    image_hash TEXT NOT NULL,
+    model_hash TEXT NOT NULL,
+    preprocess TEXT NOT NULL,
+    embedding BLOB,
+    created REAL NOT NULL,
+    PRIMARY KEY (image_hash, model_hash, preprocess)
+)
+"""
+
+
+def hash_file(path, chunk_size=1024 * 1024):
+    """SHA-256 of a file's contents, read without decoding it."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class EmbeddingCache:
+    """
+    SQLite-backed map from image hash to embedding for one model/preprocessing pair.
+
+    get() returns (found, embedding); embedding is None for a cached "no
+    face detected" result. hits and misses count lookups since opening.
+    Opened with readonly=True (e.g. in enrollment worker processes) it only
+    serves lookups; the parent process writes new entries.
+    """
+
+    def __init__(self, path=EMBEDDING_CACHE_PATH, model_path=MODEL_PATH, preprocess=str(PREPROCESS_VERSION),
+                 readonly=False, model_hash=None):
+        self.path = path
+        self.model_hash = model_hash or hash_file(model_path)
+        self.preprocess = preprocess
+        self.hits = 0
+        self.misses = 0
+        if readonly:
+            self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=30)
+        else:
+            self._conn = sqlite3.connect(path, timeout=30)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(_SCHEMA)
+            self._conn.commit()
+
+    def get(self, image_hash):
+        row = self._conn.execute(
+            "SELECT embedding FROM embeddings WHERE image_hash = ? AND model_hash = ? AND preprocess = ?",
+            (image_hash, self.model_hash, self.preprocess),
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return False, None
+        self.hits += 1
+        return True, None if row[0] is None else np.frombuffer(row[0], dtype=np.float32)
+
+    def put_many(self, entries):
+        """Store (image_hash, embedding or None) pairs in one transaction."""
+        now = time.time()
+        rows = [
+            (image_hash, self.model_hash, self.preprocess,
+             None if embedding is None else np.asarray(embedding, dtype=np.float32).tobytes(), now)
+            for image_hash, embedding in entries
+        ]
+        with self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def put(self, image_hash, embedding):
+        return self.put_many([(image_hash, embedding)])
+
+    def __len__(self):
+        return self._conn.execute(
+            "SELECT COUNT(*) FROM embeddings WHERE model_hash = ? AND preprocess = ?",
+            (self.model_hash, self.preprocess),
+        ).fetchone()[0]
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,150 @@
+"""
+Compact binary face gallery: a float32 .npy matrix plus a names/offsets sidecar.
+
+For a gallery at face_database.json the store lives next to it as
+face_database.npy (unit-length rows) and face_database.names.json. The
+matrix is opened with np.memmap, so every worker process shares one
+page-cache copy instead of parsing JSON.
+
+    python embedding_store.py convert face_database.json
+    python embedding_store.py export face_database.json exported.json
+"""
+import os
+import sys
+import json
+
+import numpy as np
+
+from face_matcher import l2_normalize
+
+STORE_FORMAT_VERSION = 1
+
+
+def store_paths(db_path):
+    """Return (matrix_path, sidecar_path) for the store belonging to db_path."""
+    base = os.path.splitext(db_path)[0]
+    return base + ".npy", base + ".names.json"
+
+
+def store_exists(db_path):
+    matrix_path, sidecar_path = store_paths(db_path)
+    return os.path.exists(matrix_path) and os.path.exists(sidecar_path)
+
+
+def _replace_atomically(path, write):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def save_store(names, embeddings, db_path, offsets=None):
+    """
+    Write names and embeddings as a binary store next to db_path.
+
+    offsets[i]:offsets[i + 1] are the matrix rows belonging to names[i];
+    by default each name owns exactly one row. The matrix is written
+    before the sidecar, so readers only ever see a sidecar whose matrix is
+    already complete.
+    """
+    matrix = np.ascontiguousarray(l2_normalize(embeddings))
+    if offsets is None:
+        offsets = list(range(len(names) + 1))
+    if len(offsets) != len(names) + 1 or offsets[-1] != len(matrix):
+        raise ValueError("offsets do not match names and embeddings")
+
+    matrix_path, sidecar_path = store_paths(db_path)
+    _replace_atomically(matrix_path, lambda f: np.save(f, matrix))
+    sidecar = {
+        "version": STORE_FORMAT_VERSION,
+        "dim": int(matrix.shape[1]) if matrix.ndim == 2 else 0,
+        "count": len(matrix),
+        "names": list(names),
+        "offsets": [int(o) for o in offsets],
+    }
+    _replace_atomically(sidecar_path, lambda f: f.write(json.dumps(sidecar).encode("utf-8")))
+    return matrix_path, sidecar_path
+
+
+def open_store(db_path):
+    """
+    Open the store next to db_path.
+
+    Returns (names, embeddings, offsets); embeddings is a read-only
+    np.memmap of unit-length float32 rows.
+    """
+    matrix_path, sidecar_path = store_paths(db_path)
+    with open(sidecar_path, 'r') as f:
+        sidecar = json.load(f)
+    if sidecar.get("version") != STORE_FORMAT_VERSION:
+        raise ValueError(f"Unsupported store version {sidecar.get('version')}")
+
+    embeddings = np.load(matrix_path, mmap_mode='r')
+    if embeddings.dtype != np.float32 or len(embeddings) != sidecar["count"]:
+        raise ValueError(f"{matrix_path} does not match {sidecar_path}")
+    return sidecar["names"], embeddings, sidecar["offsets"]
+
+
+def database_to_arrays(database):
+    """
+    Convert a {name: embedding} dict into (names, float32 matrix, offsets).
+
+    A value may be one embedding or a list of template embeddings; rows
+    offsets[i]:offsets[i + 1] belong to names[i]. Entries whose embedding
+    size differs from the first entry are skipped.
+    """
+    names = []
+    blocks = []
+    offsets = [0]
+    dim = None
+    for name, embedding in database.items():
+        rows = np.asarray(embedding, dtype=np.float32)
+        rows = rows.reshape(1, -1) if rows.ndim == 1 else rows.reshape(len(rows), -1)
+        if dim is None:
+            dim = rows.shape[1]
+        if rows.shape[1] != dim or len(rows) == 0:
+            print(f"[WARN] Skipping '{name}': embedding size {rows.shape[1]} != {dim}")
+            continue
+        names.append(name)
+        blocks.append(rows)
+        offsets.append(offsets[-1] + len(rows))
+
+    if not blocks:
+        return [], np.zeros((0, 0), dtype=np.float32), [0]
+    return names, np.ascontiguousarray(np.concatenate(blocks), dtype=np.float32), offsets
+
+
+def convert_json(json_path, db_path=None):
+    """Convert a JSON gallery into a binary store (next to db_path, default json_path)."""
+    with open(json_path, 'r') as f:
+        database = json.load(f)
+    names, embeddings, offsets = database_to_arrays(database)
+    return save_store(names, embeddings, db_path or json_path, offsets)
+
+
+def export_json(db_path, json_path, indent=None):
+    """Export the store next to db_path as a {name: embedding} JSON gallery."""
+    names, embeddings, offsets = open_store(db_path)
+    database = {}
+    for i, name in enumerate(names):
+        rows = np.asarray(embeddings[offsets[i]:offsets[i + 1]])
+        database[name] = rows[0].tolist() if len(rows) == 1 else rows.tolist()
+    tmp_path = json_path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(database, f, indent=indent)
+    os.replace(tmp_path, json_path)
+    return len(database)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 3 and sys.argv[1] == "convert":
+        matrix_path, sidecar_path = convert_json(sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else None)
+        print(f"✅ Wrote {matrix_path} and {sidecar_path}")
+    elif len(sys.argv) == 4 and sys.argv[1] == "export":
+        count = export_json(sys.argv[2], sys.argv[3])
+        print(f"✅ Exported {count} faces to {sys.argv[3]}")
+    else:
+        print(__doc__)
+        sys.exit(1)
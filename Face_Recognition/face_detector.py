@@ -0,0 +1,152 @@
+"""
+Face detection stage shared by authentication and enrollment.
+
+Detection runs on a copy of the image downscaled so its longer side is at
+most FACE_DETECT_MAX_SIDE pixels; the boxes are mapped back to the
+original resolution, so crops (and therefore embeddings) still come from
+the full-resolution image. The backend is chosen with FACE_DETECTOR:
+
+    haar   OpenCV Haar cascade (default, no extra files)
+    yunet  OpenCV DNN YuNet detector; needs the ONNX model at FACE_YUNET_MODEL
+"""
+import os
+import threading
+
+import cv2
+
+FACE_DETECTOR = os.getenv("FACE_DETECTOR", "haar")
+# Longer image side detection runs at (0 disables downscaling)
+DETECT_MAX_SIDE = int(os.getenv("FACE_DETECT_MAX_SIDE", "640"))
+YUNET_MODEL_PATH = os.getenv("FACE_YUNET_MODEL", "face_detection_yunet_2023mar.onnx")
+YUNET_SCORE_THRESHOLD = float(os.getenv("FACE_YUNET_SCORE", "0.6"))
+
+
+def haarcascade_path(filename="haarcascade_frontalface_default.xml"):
+    """Cascade file shipped with OpenCV, or the copy bundled next to this module."""
+    try:
+        return cv2.data.haarcascades + filename
+    except AttributeError:
+        return os.path.join(os.path.dirname(os.path.abspath(__file__)), filename)
+
+
+class HaarDetector:
+    """Haar cascade detector with the parameters the service has always used."""
+
+    name = "haar"
+
+    def __init__(self, cascade_path=None, scale_factor=1.3, min_neighbors=5):
+        self.cascade_path = cascade_path or haarcascade_path()
+        self.cascade = cv2.CascadeClassifier(self.cascade_path)
+        if self.cascade.empty():
+            raise ValueError(f"Could not load Haar cascade {self.cascade_path}")
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+
+    @property
+    def signature(self):
+        return f"haar:{os.path.basename(self.cascade_path)}:{self.scale_factor}:{self.min_neighbors}"
+
+    def detect(self, image):
+        """Return (x, y, w, h) boxes in image coordinates."""
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        return [tuple(int(v) for v in box) for box in self.cascade.detectMultiScale(gray, self.scale_factor,
+                                                                                   self.min_neighbors)]
+
+
+class YuNetDetector:
+    """
+    OpenCV DNN YuNet detector (cv2.FaceDetectorYN).
+
+    The OpenCV detector object keeps the input size as state, so calls are
+    serialized with a lock.
+    """
+
+    name = "yunet"
+
+    def __init__(self, model_path=YUNET_MODEL_PATH, score_threshold=YUNET_SCORE_THRESHOLD, nms_threshold=0.3,
+                 top_k=5000):
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"YuNet model not found: {model_path}")
+        self.model_path = model_path
+        self.score_threshold = score_threshold
+        self.detector = cv2.FaceDetectorYN.create(model_path, "", (320, 320), score_threshold, nms_threshold,
+                                                  top_k)
+        self._lock = threading.Lock()
+
+    @property
+    def signature(self):
+        return f"yunet:{os.path.basename(self.model_path)}:{self.score_threshold}"
+
+    def detect(self, image):
+        """Return (x, y, w, h) boxes in image coordinates."""
+        height, width = image.shape[:2]
+        with self._lock:
+            self.detector.setInputSize((width, height))
+            _, faces = self.detector.detect(image)
+        if faces is None:
+            return []
+        return [tuple(int(round(v)) for v in face[:4]) for face in faces]
+
+
+DETECTOR_BACKENDS = {
+    "haar": HaarDetector,
+    "yunet": YuNetDetector,
+}
+
+
+def create_detector(backend=FACE_DETECTOR, **kwargs):
+    if backend not in DETECTOR_BACKENDS:
+        raise ValueError(f"Unknown face detector '{backend}' (expected one of {', '.join(DETECTOR_BACKENDS)})")
+    return DETECTOR_BACKENDS[backend](**kwargs)
+
+
+def downscale_for_detection(image, max_side=DETECT_MAX_SIDE):
+    """Return (image, scale) with the longer side at most max_side; scale maps back to the original."""
+    height, width = image.shape[:2]
+    longest = max(height, width)
+    if max_side <= 0 or longest <= max_side:
+        return image, 1.0
+    scale = max_side / float(longest)
+    small = cv2.resize(image, (max(1, round(width * scale)), max(1, round(height * scale))),
+                       interpolation=cv2.INTER_AREA)
+    return small, scale
+
+
+def detect_faces(image, detector=None, max_side=DETECT_MAX_SIDE):
+    """
+    Return every face box (x, y, w, h) in a BGR image, largest first.
+
+    Detection runs on a downscaled copy; boxes are returned in (and clipped
+    to) the coordinates of the original image.
+    """
+    detector = detector or get_detector()
+    small, scale = downscale_for_detection(image, max_side)
+    height, width = image.shape[:2]
+    boxes = []
+    for x, y, w, h in detector.detect(small):
+        x0 = max(0, int(x / scale))
+        y0 = max(0, int(y / scale))
+        x1 = min(width, int(round((x + w) / scale)))
+        y1 = min(height, int(round((y + h) / scale)))
+        if x1 > x0 and y1 > y0:
+            boxes.append((x0, y0, x1 - x0, y1 - y0))
+    return sorted(boxes, key=lambda b: b[2] * b[3], reverse=True)
+
+
+def detector_signature(detector=None, max_side=DETECT_MAX_SIDE):
+    """Identifies the detector configuration, e.g. for keying cached embeddings."""
+    return f"{(detector or get_detector()).signature}@{max_side}"
+
+
+_detector = None
+_detector_lock = threading.Lock()
+
+
+def get_detector():
+    """Return the process-wide detector for FACE_DETECTOR, creating it on first use."""
+    global _detector
+    if _detector is None:
+        with _detector_lock:
+            if _detector is None:
+                _detector = create_detector()
+    return _detector
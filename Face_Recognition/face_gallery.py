@@ -0,0 +1,185 @@
+import os
+import threading
+import time
+
+import numpy as np
+
+from embedding_store import store_paths
+from gallery_log import apply_mutations, load_base, log_path_for, read_mutations
+from face_index import ANN_MIN_SIZE, ANN_NPROBE, index_path_for, load_index_for_gallery, vectors_path_for
+from face_matcher import FaceMatcher
+
+DEFAULT_DB_PATH = "face_database.json"
+
+
+class GallerySnapshot:
+    """
+    Immutable view of the face gallery: name list, float32 template matrix
+    (a shared memmap when loaded from the binary store) and offsets, where
+    rows offsets[i]:offsets[i + 1] belong to names[i]; plus a matcher over
+    the pre-normalized rows (ANN-backed for large galleries when an
+    up-to-date index is available).
+    """
+
+    __slots__ = ("names", "embeddings", "offsets", "version", "signature", "matcher")
+
+    def __init__(self, names, embeddings, version=0, signature=None, db_path=None, normalized=False,
+                 offsets=None):
+        self.names = names
+        self.embeddings = embeddings
+        self.offsets = list(range(len(names) + 1)) if offsets is None else offsets
+        self.version = version
+        self.signature = signature
+        self.matcher = FaceMatcher(names, embeddings, nprobe=ANN_NPROBE, normalized=normalized,
+                                   offsets=self.offsets)
+        if db_path and len(names) >= ANN_MIN_SIZE:
+            self.matcher.index = load_index_for_gallery(names, self.matcher.embeddings, db_path)
+
+    def __len__(self):
+        return len(self.names)
+
+    def items(self):
+        """Iterate (name, embedding) pairs, mirroring the old dict database; template sets are 2-D."""
+        for i, name in enumerate(self.names):
+            rows = self.embeddings[self.offsets[i]:self.offsets[i + 1]]
+            yield name, rows[0] if len(rows) == 1 else rows
+
+    def as_dict(self):
+        return {name: np.asarray(rows).tolist() for name, rows in self.items()}
+
+
+def _file_signature(path):
+    """Return (inode, mtime_ns, size) for path, or None when it does not exist."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+class FaceGallery:
+    """
+    Process-wide face gallery kept resident in memory.
+
+    The binary store next to db_path is memory-mapped when it is at least as
+    new as the JSON file; otherwise the JSON file is parsed. Either way this
+    happens once; afterwards each call to snapshot() only stats the files
+    (at most once per check_interval seconds). A changed inode, mtime or
+    size of the snapshot files (or the ANN index) triggers a full reload,
+    as does a new log inode or a shrunken log (compaction replaced it);
+    growth of the same log file only replays the new log records onto the
+    current snapshot. Either way a complete new snapshot is built before
+    the reference is swapped, so readers never observe a half-loaded
+    gallery.
+    """
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, check_interval=1.0):
+        self.db_path = db_path
+        self.check_interval = check_interval
+        self._snapshot = GallerySnapshot([], np.zeros((0, 0), dtype=np.float32))
+        # Reentrant: apply_log falls back to reload() when the log was replaced
+        self._reload_lock = threading.RLock()
+        self._last_check = 0.0
+        self._log_offset = 0
+        # Inode of the log file _log_offset points into (None: no log yet)
+        self._log_inode = None
+        self._normalized = True
+
+    def snapshot(self):
+        """Return the current snapshot, reloading or applying log deltas first if the files changed."""
+        now = time.monotonic()
+        if now - self._last_check >= self.check_interval:
+            self._last_check = now
+            if self._signature() != self._snapshot.signature:
+                self.reload()
+            else:
+                log_signature = _file_signature(log_path_for(self.db_path))
+                log_inode, log_size = (log_signature[0], log_signature[2]) if log_signature else (None, 0)
+                if log_size < self._log_offset or (
+                        log_inode is not None and self._log_inode is not None and log_inode != self._log_inode):
+                    # The log was compacted away under us; start from the new snapshot
+                    self.reload(force=True)
+                elif log_size > self._log_offset:
+                    self.apply_log()
+        return self._snapshot
+
+    def _signature(self):
+        matrix_path, sidecar_path = store_paths(self.db_path)
+        json_signature = _file_signature(self.db_path)
+        sidecar_signature = _file_signature(sidecar_path)
+        if json_signature is None and sidecar_signature is None:
+            return None
+        index_path = index_path_for(self.db_path)
+        return (json_signature, sidecar_signature, _file_signature(matrix_path),
+                _file_signature(index_path), _file_signature(vectors_path_for(index_path)))
+
+    def reload(self, force=False):
+        """Reload the gallery from disk if it changed (or unconditionally with force)."""
+        with self._reload_lock:
+            current = self._snapshot
+            signature = self._signature()
+            if signature is None:
+                if current.signature is not None or force:
+                    print(f"[WARN] Face database not found: {self.db_path}")
+                return current
+            if not force and signature == current.signature:
+                return current
+
+            try:
+                names, embeddings, offsets, normalized = load_base(self.db_path)
+                snapshot = GallerySnapshot(names, embeddings, current.version + 1, signature,
+                                           db_path=self.db_path, normalized=normalized, offsets=offsets)
+                ops, log_offset, log_inode = read_mutations(self.db_path)
+            except Exception as e:
+                print(f"[WARN] Could not load {self.db_path}: {e}")
+                return current
+
+            if ops:
+                names, embeddings, offsets = apply_mutations(names, embeddings, offsets, ops)
+                snapshot = GallerySnapshot(names, embeddings, snapshot.version, signature,
+                                           normalized=normalized, offsets=offsets)
+            self._normalized = normalized
+            self._log_offset = log_offset
+            self._log_inode = log_inode
+            self._snapshot = snapshot
+            print(f"[INFO] Loaded face gallery with {len(names)} identities from {self.db_path}"
+                  f" ({len(ops)} log records applied)")
+            return self._snapshot
+
+    def apply_log(self):
+        """Apply log records appended since the last load to the in-memory snapshot."""
+        with self._reload_lock:
+            current = self._snapshot
+            ops, log_offset, log_inode = read_mutations(self.db_path, self._log_offset)
+            if log_inode is not None and self._log_inode is not None and log_inode != self._log_inode:
+                # Compacted between the stat and the read; the offset belongs to the old file
+                return self.reload(force=True)
+            self._log_inode = log_inode or self._log_inode
+            if not ops:
+                self._log_offset = log_offset
+                return current
+
+            names, embeddings, offsets = apply_mutations(current.names, current.embeddings, current.offsets, ops)
+            # The persisted ANN index no longer matches the rows; search
+            # exactly until the next compaction rebuilds the snapshot
+            self._snapshot = GallerySnapshot(names, embeddings, current.version + 1, current.signature,
+                                             normalized=self._normalized, offsets=offsets)
+            self._log_offset = log_offset
+            print(f"[INFO] Applied {len(ops)} gallery log records ({len(names)} identities)")
+            return self._snapshot
+
+
+_gallery = None
+_gallery_lock = threading.Lock()
+
+
+def get_gallery():
+    """Return the shared FaceGallery, loading it on first use."""
+    global _gallery
+    if _gallery is None:
+        with _gallery_lock:
+            if _gallery is None:
+                gallery = FaceGallery(os.getenv("FACE_DATABASE_PATH", DEFAULT_DB_PATH))
+                gallery.reload(force=True)
+                _gallery = gallery
+    return _gallery
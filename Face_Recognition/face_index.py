@@ -0,0 +1,181 @@
+import os
+import hashlib
+
+import numpy as np
+
+from face_matcher import l2_normalize
+
+# Galleries smaller than this are always searched exactly
+ANN_MIN_SIZE = int(os.getenv("FACE_ANN_MIN_SIZE", "20000"))
+# Number of inverted lists probed per query: higher = better recall, slower
+ANN_NPROBE = int(os.getenv("FACE_ANN_NPROBE", "8"))
+
+
+def index_path_for(db_path):
+    """Location of the ANN index persisted next to a gallery file."""
+    return os.path.splitext(db_path)[0] + ".ivf.npz"
+
+
+def vectors_path_for(index_path):
+    """Location of the list-ordered gallery rows saved alongside an index."""
+    return os.path.splitext(index_path)[0] + ".npy"
+
+
+def names_fingerprint(names):
+    """Hash of the gallery row order, used to detect a stale index."""
+    digest = hashlib.sha1()
+    for name in names:
+        digest.update(name.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _assign(vectors, centroids, chunk_size=65536):
+    """Index of the most similar centroid for each (normalized) vector."""
+    assignment = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), chunk_size):
+        block = vectors[start:start + chunk_size]
+        assignment[start:start + chunk_size] = np.argmax(block @ centroids.T, axis=1)
+    return assignment
+
+
+def _train_centroids(vectors, n_lists, n_iter, seed):
+    """Spherical k-means on a sample of the vectors."""
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(vectors), max(n_lists * 64, 10000))
+    sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+    centroids = sample[rng.choice(sample_size, n_lists, replace=False)].copy()
+
+    for _ in range(n_iter):
+        assignment = _assign(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, sample)
+        empty = np.bincount(assignment, minlength=n_lists) == 0
+        # Re-seed empty lists with random sample points
+        sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+        centroids = l2_normalize(sums)
+    return centroids
+
+
+class IVFIndex:
+    """
+    Inverted-file (IVF-flat) index over normalized face embeddings.
+
+    Vectors are clustered into n_lists cells; a query scores the centroids,
+    then scans only the nprobe closest cells exactly. A saved index keeps
+    the rows in list order in a .npy next to it, which load() memory-maps so
+    worker processes share one page-cache copy.
+    """
+
+    def __init__(self, centroids, list_offsets, list_ids, fingerprint=None):
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_ids = list_ids
+        self.fingerprint = fingerprint
+        self.vectors = None
+
+    @classmethod
+    def build(cls, embeddings, n_lists=None, n_iter=10, seed=0, fingerprint=None):
+        vectors = l2_normalize(embeddings)
+        if n_lists is None:
+            n_lists = max(1, int(np.sqrt(len(vectors))))
+        n_lists = min(n_lists, len(vectors))
+
+        centroids = _train_centroids(vectors, n_lists, n_iter, seed)
+        assignment = _assign(vectors, centroids)
+        list_ids = np.argsort(assignment, kind="stable")
+        counts = np.bincount(assignment, minlength=n_lists)
+        list_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+        index = cls(centroids, list_offsets, list_ids, fingerprint)
+        index.attach(vectors)
+        return index
+
+    def attach(self, normalized_embeddings):
+        """
+        Lay out the gallery rows contiguously by list for fast scanning.
+
+        Rows memory-mapped by load() are kept when they match the gallery;
+        otherwise (e.g. an index saved without them) they are copied.
+        """
+        if self.vectors is not None and self._vectors_match(normalized_embeddings):
+            return
+        if self.vectors is not None:
+            print("[WARN] ANN index rows do not match the gallery; copying them into memory")
+        self.vectors = np.ascontiguousarray(normalized_embeddings[self.list_ids])
+
+    def _vectors_match(self, normalized_embeddings, samples=32):
+        """Spot-check the list-ordered rows against the gallery rows they stand for."""
+        if self.vectors.shape != (len(self.list_ids), normalized_embeddings.shape[1]):
+            return False
+        positions = np.unique(np.linspace(0, len(self.list_ids) - 1, samples).astype(np.int64))
+        return np.allclose(self.vectors[positions], normalized_embeddings[self.list_ids[positions]], atol=1e-6)
+
+    def __len__(self):
+        return len(self.list_ids)
+
+    def search(self, queries, top_k=1, nprobe=ANN_NPROBE):
+        """Return (indices, scores) of the approximate top_k gallery rows per query."""
+        queries = l2_normalize(np.atleast_2d(queries))
+        nprobe = max(1, min(nprobe, len(self.centroids)))
+        probe = np.argsort(-(queries @ self.centroids.T), axis=1)[:, :nprobe]
+
+        indices = np.full((len(queries), top_k), -1, dtype=np.int64)
+        scores = np.full((len(queries), top_k), -np.inf, dtype=np.float32)
+        for q, lists in enumerate(probe):
+            positions = np.concatenate([
+                np.arange(self.list_offsets[l], self.list_offsets[l + 1]) for l in lists
+            ])
+            if len(positions) == 0:
+                continue
+            row_scores = self.vectors[positions] @ queries[q]
+            k = min(top_k, len(positions))
+            best = np.argpartition(-row_scores, k - 1)[:k]
+            best = best[np.argsort(-row_scores[best])]
+            indices[q, :k] = self.list_ids[positions[best]]
+            scores[q, :k] = row_scores[best]
+        return indices, scores
+
+    def save(self, path):
+        # Rows first: the .npz is what marks the index as present
+        vectors_path = vectors_path_for(path)
+        np.save(vectors_path + ".tmp.npy", np.ascontiguousarray(self.vectors, dtype=np.float32))
+        os.replace(vectors_path + ".tmp.npy", vectors_path)
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, centroids=self.centroids, list_offsets=self.list_offsets,
+                 list_ids=self.list_ids, fingerprint=np.array(self.fingerprint or ""))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            index = cls(data["centroids"], data["list_offsets"], data["list_ids"],
+                        str(data["fingerprint"]) or None)
+        vectors_path = vectors_path_for(path)
+        if os.path.exists(vectors_path):
+            index.vectors = np.load(vectors_path, mmap_mode='r')
+        return index
+
+
+def build_index_for_gallery(names, embeddings, db_path, n_lists=None):
+    """Build an IVF index for a gallery and persist it next to db_path."""
+    index = IVFIndex.build(embeddings, n_lists=n_lists, fingerprint=names_fingerprint(names))
+    index.save(index_path_for(db_path))
+    return index
+
+
+def load_index_for_gallery(names, normalized_embeddings, db_path):
+    """Load the persisted index over a gallery's template rows, or None if absent or stale."""
+    path = index_path_for(db_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        index = IVFIndex.load(path)
+    except Exception as e:
+        print(f"[WARN] Could not load ANN index {path}: {e}")
+        return None
+    if len(index) != len(normalized_embeddings) or index.fingerprint != names_fingerprint(names):
+        print(f"[WARN] Ignoring stale ANN index {path}")
+        return None
+    index.attach(normalized_embeddings)
+    return index
@@ -0,0 +1,169 @@
+import os
+
+import numpy as np
+
+# How per-template scores combine into one identity score: "max" or "mean"
+TEMPLATE_AGGREGATION = os.getenv("FACE_TEMPLATE_AGGREGATION", "max")
+# Least ANN rows gathered per query with "mean" aggregation, whose best
+# identity need not own the best single row
+MEAN_CANDIDATE_ROWS = int(os.getenv("FACE_MEAN_CANDIDATE_ROWS", "64"))
+
+
+def l2_normalize(vectors):
+    """Return float32 copies of vectors scaled to unit length along the last axis."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class FaceMatcher:
+    """
+    Brute-force cosine matcher over a gallery matrix.
+
+    The gallery is L2-normalized once at construction, so scoring a query
+    (or a batch of queries) is a single matrix product. Identities may own
+    several template rows (offsets[i]:offsets[i + 1] belong to names[i]);
+    their row scores are reduced per identity with one max/mean reduceat.
+    When an ANN index is attached, search() delegates to it and probes
+    nprobe lists instead; with "mean" aggregation the identities it finds
+    are re-scored exactly over all of their template rows.
+    """
+
+    def __init__(self, names, embeddings, index=None, nprobe=8, normalized=False, offsets=None,
+                 aggregation=TEMPLATE_AGGREGATION):
+        self.names = list(names)
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if embeddings.size == 0:
+            embeddings = embeddings.reshape(0, 0)
+        # Rows that are already unit length (e.g. a memory-mapped store) are
+        # used in place so the pages stay shared between processes
+        self.embeddings = embeddings if normalized else np.ascontiguousarray(l2_normalize(embeddings))
+        self.index = index
+        self.nprobe = nprobe
+        self.aggregation = aggregation
+
+        if offsets is None:
+            offsets = np.arange(len(self.names) + 1)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        counts = np.diff(self.offsets)
+        self.has_templates = len(self.embeddings) != len(self.names)
+        self.max_templates = int(counts.max()) if len(counts) else 1
+        self._counts = counts.astype(np.float32)
+        self._row_identity = np.repeat(np.arange(len(self.names)), counts)
+
+    def __len__(self):
+        return len(self.names)
+
+    def scores(self, queries):
+        """Cosine similarity of each query against every identity, shape (n_queries, n_identities)."""
+        queries = l2_normalize(np.atleast_2d(queries))
+        row_scores = queries @ self.embeddings.T
+        if not self.has_templates:
+            return row_scores
+        starts = self.offsets[:-1]
+        if self.aggregation == "mean":
+            return np.add.reduceat(row_scores, starts, axis=1) / self._counts
+        return np.maximum.reduceat(row_scores, starts, axis=1)
+
+    def _mean_scores(self, query, identities):
+        """Exact mean template score of a normalized query for the given identities."""
+        counts = np.diff(self.offsets)[identities]
+        rows = np.concatenate([np.arange(start, start + count)
+                               for start, count in zip(self.offsets[identities], counts)])
+        row_scores = self.embeddings[rows] @ query
+        return np.add.reduceat(row_scores, np.concatenate([[0], np.cumsum(counts)[:-1]])) / counts
+
+    def _search_index(self, queries, top_k):
+        """
+        ANN search over template rows, reduced per identity.
+
+        With "max" aggregation the best-scoring row found stands for its
+        identity; with "mean" every identity found is re-scored exactly
+        from all of its rows, so ANN and exact search rank alike.
+        """
+        row_k = top_k * self.max_templates
+        if self.has_templates and self.aggregation == "mean":
+            row_k = max(row_k, MEAN_CANDIDATE_ROWS)
+        rows, row_scores = self.index.search(queries, top_k=row_k, nprobe=self.nprobe)
+        if not self.has_templates:
+            return rows, row_scores
+
+        if self.aggregation == "mean":
+            queries = l2_normalize(np.atleast_2d(queries))
+            indices = np.full((len(rows), top_k), -1, dtype=np.int64)
+            scores = np.full((len(rows), top_k), -np.inf, dtype=np.float32)
+            for q, q_rows in enumerate(rows):
+                identities = np.unique(self._row_identity[q_rows[q_rows >= 0]])
+                if len(identities) == 0:
+                    continue
+                identity_scores = self._mean_scores(queries[q], identities)
+                best = np.argsort(-identity_scores)[:top_k]
+                indices[q, :len(best)] = identities[best]
+                scores[q, :len(best)] = identity_scores[best]
+            return indices, scores
+
+        indices = np.full((len(rows), top_k), -1, dtype=np.int64)
+        scores = np.full((len(rows), top_k), -np.inf, dtype=np.float32)
+        for q, (q_rows, q_scores) in enumerate(zip(rows, row_scores)):
+            seen = []
+            for row, score in zip(q_rows, q_scores):
+                if row < 0:
+                    continue
+                identity = self._row_identity[row]
+                if identity in seen:
+                    continue
+                indices[q, len(seen)] = identity
+                scores[q, len(seen)] = score
+                seen.append(identity)
+                if len(seen) == top_k:
+                    break
+        return indices, scores
+
+    def search(self, queries, top_k=1, exact=False):
+        """Return (indices, scores) of the top_k identities per query, best first."""
+        if self.index is not None and not exact:
+            return self._search_index(queries, top_k)
+        scores = self.scores(queries)
+        k = min(top_k, scores.shape[1])
+        if k == 0:
+            empty = np.zeros((scores.shape[0], 0))
+            return empty.astype(np.int64), empty.astype(np.float32)
+        if k < scores.shape[1]:
+            part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            part = np.tile(np.arange(scores.shape[1]), (scores.shape[0], 1))
+        part_scores = np.take_along_axis(scores, part, axis=1)
+        order = np.argsort(-part_scores, axis=1)
+        return np.take_along_axis(part, order, axis=1), np.take_along_axis(part_scores, order, axis=1)
+
+    def match_batch(self, queries, top_k=1, threshold=0.3):
+        """
+        Match a batch of query embeddings.
+
+        Returns one dict per query with the thresholded decision ("name" is
+        None when the best score does not exceed threshold), the best
+        "similarity", and the top_k "candidates" as (name, score) pairs.
+        """
+        queries = np.atleast_2d(queries)
+        if len(self) == 0:
+            return [{"name": None, "similarity": -1.0, "candidates": []} for _ in range(len(queries))]
+
+        indices, scores = self.search(queries, top_k=max(1, top_k))
+        results = []
+        for row_indices, row_scores in zip(indices, scores):
+            candidates = [(self.names[i], float(s)) for i, s in zip(row_indices, row_scores) if i >= 0]
+            if not candidates:
+                results.append({"name": None, "similarity": -1.0, "candidates": []})
+                continue
+            best_name, best_score = candidates[0]
+            results.append({
+                "name": best_name if best_score > threshold else None,
+                "similarity": best_score,
+                "candidates": candidates[:top_k],
+            })
+        return results
+
+    def match(self, query, top_k=1, threshold=0.3):
+        """Match a single query embedding; see match_batch."""
+        return self.match_batch(query, top_k=top_k, threshold=threshold)[0]
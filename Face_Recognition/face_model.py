@@ -0,0 +1,206 @@
+import os
+os.environ["TF_ENABLE_ONEDNN_OPTS"] = "0"
+os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
+
+# Disable GPU to avoid libdevice JIT errors
+os.environ["CUDA_VISIBLE_DEVICES"] = "-1"
+
+import queue
+import threading
+import warnings
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+
+# Prefer a standalone TFLite interpreter; full TensorFlow (seconds of import
+# time and hundreds of MB per worker) is only a fallback.
+# FACE_TFLITE_BACKEND forces one of: tflite_runtime, ai_edge_litert, tensorflow
+_BACKENDS = ("tflite_runtime", "ai_edge_litert", "tensorflow")
+_requested_backend = os.getenv("FACE_TFLITE_BACKEND", "auto")
+TFLITE_BACKEND = None
+for _backend in _BACKENDS:
+    if _requested_backend not in ("auto", _backend):
+        continue
+    try:
+        if _backend == "tflite_runtime":
+            from tflite_runtime.interpreter import Interpreter, OpResolverType
+        elif _backend == "ai_edge_litert":
+            from ai_edge_litert.interpreter import Interpreter, OpResolverType
+        else:
+            import tensorflow as tf
+            warnings.filterwarnings("ignore", category=UserWarning, module="tensorflow.lite.python.interpreter")
+            Interpreter = tf.lite.Interpreter
+            OpResolverType = tf.lite.experimental.OpResolverType
+        TFLITE_BACKEND = _backend
+        break
+    except ImportError:
+        continue
+if TFLITE_BACKEND is None:
+    raise ImportError("No TFLite interpreter found: install tflite-runtime (or tensorflow as a fallback)")
+
+MODEL_PATH = os.getenv("FACE_MODEL_PATH", "mobilefacenet.tflite")
+# Largest number of faces sent through the interpreter in one invoke()
+EMBEDDING_BATCH_SIZE = int(os.getenv("FACE_EMBEDDING_BATCH_SIZE", "16"))
+# Interpreters kept per process, and intra-op threads each one may use
+# (0 lets TFLite decide)
+INTERPRETER_POOL_SIZE = int(os.getenv("FACE_INTERPRETERS", "1"))
+INTERPRETER_THREADS = int(os.getenv("FACE_NUM_THREADS", "0"))
+USE_XNNPACK = os.getenv("FACE_XNNPACK", "1").lower() in ("1", "true", "yes")
+INPUT_SIZE = 112
+# Bump whenever face detection, cropping or preprocess_faces changes, so
+# cached enrollment embeddings are recomputed
+PREPROCESS_VERSION = 1
+
+
+def preprocess_faces(faces):
+    """
+    Resize BGR face crops to the model input and stack them into one float32 batch.
+
+    cv2.INTER_LINEAR uses the same half-pixel bilinear sampling as the
+    tf.image.resize call this replaces, so embeddings stay comparable with
+    galleries registered before the switch.
+    """
+    batch = np.empty((len(faces), INPUT_SIZE, INPUT_SIZE, 3), dtype=np.float32)
+    for i, face in enumerate(faces):
+        batch[i] = cv2.resize(face, (INPUT_SIZE, INPUT_SIZE), interpolation=cv2.INTER_LINEAR)
+    np.multiply(batch, 1.0 / 255.0, out=batch)
+    return batch
+
+
+def create_interpreter(model_path=MODEL_PATH, num_threads=INTERPRETER_THREADS, use_xnnpack=USE_XNNPACK):
+    """
+    Build a TFLite interpreter.
+
+    XNNPACK is TFLite's default CPU delegate for float models; with
+    use_xnnpack=False the plain builtin kernels are used instead.
+    """
+    kwargs = {"model_path": model_path}
+    if num_threads:
+        kwargs["num_threads"] = num_threads
+    if not use_xnnpack:
+        kwargs["experimental_op_resolver_type"] = OpResolverType.BUILTIN_WITHOUT_DEFAULT_DELEGATES
+    return Interpreter(**kwargs)
+
+
+def normalize_embeddings(embeddings):
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return embeddings / norms
+
+
+class FaceEmbedder:
+    """
+    MobileFaceNet TFLite model with a resizable batch dimension.
+
+    embed() runs up to max_batch faces through a single invoke(); the input
+    tensor is only resized (and tensors reallocated) when the batch size
+    changes between calls.
+    """
+
+    def __init__(self, model_path=MODEL_PATH, max_batch=EMBEDDING_BATCH_SIZE,
+                 num_threads=INTERPRETER_THREADS, use_xnnpack=USE_XNNPACK):
+        self.max_batch = max(1, max_batch)
+        self.interpreter = create_interpreter(model_path, num_threads, use_xnnpack)
+        self.interpreter.allocate_tensors()
+        self.input_index = self.interpreter.get_input_details()[0]['index']
+        self.output_index = self.interpreter.get_output_details()[0]['index']
+        self._batch_size = int(self.interpreter.get_input_details()[0]['shape'][0])
+        self._lock = threading.Lock()
+
+    def _resize_batch(self, batch_size):
+        if batch_size != self._batch_size:
+            self.interpreter.resize_tensor_input(self.input_index, [batch_size, INPUT_SIZE, INPUT_SIZE, 3])
+            self.interpreter.allocate_tensors()
+            self._batch_size = batch_size
+
+    def embed_batch(self, batch):
+        """Run one preprocessed batch (at most max_batch faces) and return raw embeddings."""
+        with self._lock:
+            self._resize_batch(len(batch))
+            self.interpreter.set_tensor(self.input_index, batch)
+            self.interpreter.invoke()
+            return self.interpreter.get_tensor(self.output_index).reshape(len(batch), -1).copy()
+
+    def embed(self, faces):
+        """Return L2-normalized embeddings, shape (len(faces), dim), for a list of BGR face crops."""
+        if len(faces) == 0:
+            return np.zeros((0, 0), dtype=np.float32)
+        chunks = []
+        for start in range(0, len(faces), self.max_batch):
+            batch = preprocess_faces(faces[start:start + self.max_batch])
+            chunks.append(self.embed_batch(batch))
+        return normalize_embeddings(np.concatenate(chunks))
+
+
+class InterpreterPool:
+    """
+    Fixed pool of FaceEmbedders, one interpreter each.
+
+    Callers check an embedder out for the duration of one batch, so up to
+    `size` batches run in parallel, each using `num_threads` intra-op
+    threads. Checkout blocks until an embedder is free.
+    """
+
+    def __init__(self, size=INTERPRETER_POOL_SIZE, model_path=MODEL_PATH, max_batch=EMBEDDING_BATCH_SIZE,
+                 num_threads=INTERPRETER_THREADS, use_xnnpack=USE_XNNPACK):
+        self.size = max(1, size)
+        self.max_batch = max(1, max_batch)
+        self.num_threads = num_threads
+        self.use_xnnpack = use_xnnpack
+        self._available = queue.LifoQueue()
+        for _ in range(self.size):
+            self._available.put(FaceEmbedder(model_path, max_batch, num_threads, use_xnnpack))
+
+    @contextmanager
+    def checkout(self, timeout=None):
+        try:
+            embedder = self._available.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError(f"No free interpreter after {timeout}s")
+        try:
+            yield embedder
+        finally:
+            self._available.put(embedder)
+
+    def embed(self, faces):
+        with self.checkout() as embedder:
+            return embedder.embed(faces)
+
+    def available(self):
+        return self._available.qsize()
+
+
+_embedder = None
+_embedder_pid = None
+_embedder_lock = threading.Lock()
+
+
+def get_embedder():
+    """
+    Return the process-wide interpreter pool, creating it on first use.
+
+    Interpreters are not shared across fork(); a forked worker (e.g. under
+    Gunicorn --preload) builds its own pool.
+    """
+    global _embedder, _embedder_pid
+    if _embedder is None or _embedder_pid != os.getpid():
+        with _embedder_lock:
+            if _embedder is None or _embedder_pid != os.getpid():
+                _embedder = InterpreterPool()
+                _embedder_pid = os.getpid()
+    return _embedder
+
+
+def configure_embedder(**pool_kwargs):
+    """Replace this process's interpreter pool, e.g. with a single-threaded one in a worker process."""
+    global _embedder, _embedder_pid
+    with _embedder_lock:
+        _embedder = InterpreterPool(**pool_kwargs)
+        _embedder_pid = os.getpid()
+    return _embedder
+
+
+def embed_faces(faces):
+    """Embed a list of BGR face crops with the shared pool, batching invokes."""
+    return get_embedder().embed(faces)
@@ -0,0 +1,273 @@
+"""
+Append-only mutation log for the face gallery.
+
+Enrollments, renames and deletions are appended to <base>.log.jsonl next
+to the gallery instead of rewriting it. The serving process replays only
+the new tail of the log onto its in-memory snapshot. Compaction folds the
+log into a fresh binary snapshot (written to temp files and renamed into
+place) and then empties the log.
+
+    python gallery_log.py compact face_database.json
+"""
+import os
+import sys
+import json
+import fcntl
+from contextlib import contextmanager
+
+import numpy as np
+
+from embedding_store import database_to_arrays, open_store, save_store, store_paths
+from face_matcher import l2_normalize
+
+# Compact once the log outgrows this share of the snapshot matrix (but not
+# before it reaches COMPACT_MIN_BYTES)
+COMPACT_RATIO = float(os.getenv("GALLERY_COMPACT_RATIO", "0.25"))
+COMPACT_MIN_BYTES = int(os.getenv("GALLERY_COMPACT_MIN_BYTES", str(1024 * 1024)))
+
+
+def log_path_for(db_path):
+    return os.path.splitext(db_path)[0] + ".log.jsonl"
+
+
+@contextmanager
+def gallery_lock(db_path):
+    """Exclusive lock serializing log appends against compaction."""
+    with open(os.path.splitext(db_path)[0] + ".log.lock", 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def add_op(name, embedding):
+    return {"op": "add", "name": name, "embedding": np.asarray(embedding, dtype=np.float32).tolist()}
+
+
+def rename_op(name, new_name):
+    return {"op": "rename", "name": name, "new_name": new_name}
+
+
+def delete_op(name):
+    return {"op": "delete", "name": name}
+
+
+def append_mutations(db_path, ops):
+    """Durably append mutation records to the gallery log in one write."""
+    if not ops:
+        return 0
+    payload = "".join(json.dumps(op) + "\n" for op in ops).encode("utf-8")
+    with gallery_lock(db_path):
+        fd = os.open(log_path_for(db_path), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, payload)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    return len(ops)
+
+
+def read_mutations(db_path, offset=0):
+    """
+    Return (ops, new_offset, inode) for the complete log records after byte offset.
+
+    inode identifies the log file that was read (None when there is none);
+    compaction replaces the log with a new file, after which offsets into
+    the old one are meaningless.
+    """
+    try:
+        with open(log_path_for(db_path), 'rb') as f:
+            inode = os.fstat(f.fileno()).st_ino
+            f.seek(offset)
+            data = f.read()
+    except FileNotFoundError:
+        return [], 0, None
+
+    # Ignore a trailing partial record; it is picked up once complete
+    end = data.rfind(b"\n") + 1
+    ops = []
+    for line in data[:end].splitlines():
+        try:
+            ops.append(json.loads(line))
+        except ValueError:
+            print(f"[WARN] Skipping corrupt gallery log record: {line[:80]!r}")
+    return ops, offset + end, inode
+
+
+def apply_mutations(names, embeddings, offsets, ops):
+    """
+    Apply log records to a gallery snapshot without touching disk.
+
+    Returns new (names, embeddings, offsets). Rows are copied only when
+    identities are removed or added; a rename-only delta reuses the
+    existing matrix.
+    """
+    names = list(names)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    position = {name: i for i, name in enumerate(names)}
+    alive = np.ones(len(names), dtype=bool)
+    added = {}
+    dim = embeddings.shape[1] if embeddings.ndim == 2 and embeddings.size else None
+
+    def drop(name):
+        added.pop(name, None)
+        i = position.pop(name, None)
+        if i is not None:
+            alive[i] = False
+
+    for op in ops:
+        kind, name = op.get("op"), op.get("name")
+        if kind in ("add", "replace"):
+            rows = np.asarray(op["embedding"], dtype=np.float32)
+            rows = rows.reshape(1, -1) if rows.ndim == 1 else rows
+            if dim is not None and rows.shape[1] != dim:
+                print(f"[WARN] Skipping log record for '{name}': embedding size {rows.shape[1]} != {dim}")
+                continue
+            dim = rows.shape[1]
+            drop(name)
+            added[name] = l2_normalize(rows)
+        elif kind == "delete":
+            drop(name)
+        elif kind == "rename":
+            new_name = op["new_name"]
+            if new_name == name:
+                continue
+            if name in added:
+                rows = added.pop(name)
+                drop(new_name)
+                added[new_name] = rows
+            elif name in position:
+                drop(new_name)
+                i = position.pop(name)
+                names[i] = new_name
+                position[new_name] = i
+
+    counts = np.diff(offsets)
+    if alive.all():
+        base = embeddings
+        kept_names = names
+        kept_counts = counts
+    else:
+        base = embeddings[np.repeat(alive, counts)]
+        kept_names = [name for name, keep in zip(names, alive) if keep]
+        kept_counts = counts[alive]
+
+    if added:
+        blocks = [np.asarray(base, dtype=np.float32).reshape(-1, dim)] + list(added.values())
+        base = np.ascontiguousarray(np.concatenate(blocks))
+        kept_names = kept_names + list(added.keys())
+        kept_counts = np.concatenate([kept_counts, [len(rows) for rows in added.values()]])
+
+    new_offsets = np.concatenate([[0], np.cumsum(kept_counts)]).astype(np.int64)
+    return kept_names, base, new_offsets.tolist()
+
+
+def load_base(db_path):
+    """
+    Load the newest snapshot on disk, ignoring the log.
+
+    Returns (names, embeddings, offsets, normalized): the memory-mapped
+    binary store when it is at least as new as the JSON file, otherwise the
+    parsed JSON gallery.
+    """
+    matrix_path, sidecar_path = store_paths(db_path)
+    try:
+        store_mtime = min(os.stat(sidecar_path).st_mtime_ns, os.stat(matrix_path).st_mtime_ns)
+    except OSError:
+        store_mtime = None
+    try:
+        json_mtime = os.stat(db_path).st_mtime_ns
+    except OSError:
+        json_mtime = None
+
+    if store_mtime is not None and (json_mtime is None or store_mtime >= json_mtime):
+        names, embeddings, offsets = open_store(db_path)
+        return names, embeddings, offsets, True
+    if json_mtime is None:
+        return [], np.zeros((0, 0), dtype=np.float32), [0], True
+    with open(db_path, 'r') as f:
+        names, embeddings, offsets = database_to_arrays(json.load(f))
+    return names, embeddings, offsets, False
+
+
+def load_state(db_path):
+    """Return (names, embeddings, offsets) of the snapshot with the whole log applied."""
+    names, embeddings, offsets, _ = load_base(db_path)
+    ops, _, _ = read_mutations(db_path)
+    if ops:
+        names, embeddings, offsets = apply_mutations(names, embeddings, offsets, ops)
+    return names, embeddings, offsets
+
+
+def state_to_database(names, embeddings, offsets):
+    """Convert arrays back into a {name: embedding or [templates]} dict."""
+    database = {}
+    for i, name in enumerate(names):
+        rows = np.asarray(embeddings[offsets[i]:offsets[i + 1]])
+        database[name] = rows[0].tolist() if len(rows) == 1 else rows.tolist()
+    return database
+
+
+def _write_json_export(db_path, names, embeddings, offsets):
+    tmp_path = db_path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state_to_database(names, embeddings, offsets), f)
+    os.replace(tmp_path, db_path)
+
+
+def _truncate_log(db_path):
+    log_path = log_path_for(db_path)
+    tmp_path = log_path + ".tmp"
+    open(tmp_path, 'wb').close()
+    os.replace(tmp_path, log_path)
+
+
+def write_snapshot(db_path, names, embeddings, offsets, export_json=True):
+    """
+    Replace the whole gallery with the given arrays and empty the log.
+
+    The optional JSON export is renamed into place before the binary store,
+    so the store is never older than the JSON and stays the loaded source.
+    """
+    with gallery_lock(db_path):
+        if export_json:
+            _write_json_export(db_path, names, embeddings, offsets)
+        save_store(names, embeddings, db_path, offsets)
+        _truncate_log(db_path)
+
+
+def compact(db_path, export_json=True):
+    """Fold the log into a new binary snapshot and empty the log."""
+    with gallery_lock(db_path):
+        names, embeddings, offsets = load_state(db_path)
+        if export_json:
+            _write_json_export(db_path, names, embeddings, offsets)
+        save_store(names, embeddings, db_path, offsets)
+        _truncate_log(db_path)
+    return len(names)
+
+
+def maybe_compact(db_path, ratio=COMPACT_RATIO, min_bytes=COMPACT_MIN_BYTES, export_json=True):
+    """Compact when the log has grown large relative to the snapshot; returns True if it did."""
+    try:
+        log_size = os.path.getsize(log_path_for(db_path))
+    except OSError:
+        return False
+    try:
+        snapshot_size = os.path.getsize(store_paths(db_path)[0])
+    except OSError:
+        snapshot_size = 0
+    if log_size < max(min_bytes, ratio * snapshot_size):
+        return False
+    compact(db_path, export_json=export_json)
+    return True
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "compact":
+        count = compact(sys.argv[2])
+        print(f"✅ Compacted gallery log into snapshot with {count} faces")
+    else:
+        print(__doc__)
+        sys.exit(1)
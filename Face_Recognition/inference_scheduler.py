@@ -0,0 +1,181 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from face_model import EMBEDDING_BATCH_SIZE, get_embedder
+
+# Most faces coalesced into one invoke()
+BATCH_MAX = int(os.getenv("FACE_BATCH_MAX", str(EMBEDDING_BATCH_SIZE)))
+# Longest the worker waits for more requests once it holds one
+BATCH_WAIT_MS = float(os.getenv("FACE_BATCH_WAIT_MS", "2"))
+# Pending requests allowed before submit() rejects new work
+QUEUE_SIZE = int(os.getenv("FACE_QUEUE_SIZE", "256"))
+
+
+class SchedulerOverloaded(RuntimeError):
+    """Raised when the inference queue is full."""
+
+
+class _Request:
+    __slots__ = ("faces", "future", "enqueued")
+
+    def __init__(self, faces):
+        self.faces = faces
+        self.future = Future()
+        self.enqueued = time.perf_counter()
+
+
+class EmbeddingScheduler:
+    """
+    Micro-batching front end for the face embedding model.
+
+    Request threads submit face crops to a bounded queue. Worker threads
+    (one per pooled interpreter) are the only callers of the embedder:
+    each takes the first pending request, keeps collecting more for up to
+    max_wait_ms or until max_batch faces are queued, runs them through one
+    batched invoke, and resolves each request's future with its own rows.
+    """
+
+    def __init__(self, embedder, max_batch=BATCH_MAX, max_wait_ms=BATCH_WAIT_MS, max_queue=QUEUE_SIZE,
+                 workers=1):
+        self.embedder = embedder
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "requests": 0,
+            "faces": 0,
+            "batches": 0,
+            "rejected": 0,
+            "errors": 0,
+            "max_queue_depth": 0,
+            "total_queue_wait_ms": 0.0,
+            "total_inference_ms": 0.0,
+        }
+        self._collect_lock = threading.Lock()
+        self._workers = [
+            threading.Thread(target=self._run, name=f"embedding-scheduler-{i}", daemon=True)
+            for i in range(max(1, workers))
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, faces):
+        """Queue a list of BGR face crops; returns a Future of their (n, dim) embeddings."""
+        request = _Request(list(faces))
+        if not request.faces:
+            request.future.set_result(np.zeros((0, 0), dtype=np.float32))
+            return request.future
+        try:
+            self._queue.put_nowait(request)
+        except queue.Full:
+            with self._stats_lock:
+                self._stats["rejected"] += 1
+            raise SchedulerOverloaded(f"Inference queue full ({self._queue.maxsize} pending requests)")
+        with self._stats_lock:
+            self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], self._queue.qsize())
+        return request.future
+
+    def embed(self, faces, timeout=None):
+        """Submit faces and wait for their embeddings."""
+        return self.submit(faces).result(timeout=timeout)
+
+    def _collect(self):
+        """Block for one request, then gather more until the batch is full or the wait expires."""
+        batch = [self._queue.get()]
+        count = len(batch[0].faces)
+        deadline = time.perf_counter() + self.max_wait
+        while count < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(request)
+            count += len(request.faces)
+        return batch, count
+
+    def _run(self):
+        while True:
+            # One worker gathers a batch at a time; the others are busy
+            # running theirs on separate interpreters meanwhile
+            with self._collect_lock:
+                batch, count = self._collect()
+            started = time.perf_counter()
+            try:
+                embeddings = self.embedder.embed([face for request in batch for face in request.faces])
+                error = None
+            except Exception as e:
+                embeddings, error = None, e
+            finished = time.perf_counter()
+
+            offset = 0
+            for request in batch:
+                if error is not None:
+                    request.future.set_exception(error)
+                else:
+                    request.future.set_result(embeddings[offset:offset + len(request.faces)])
+                offset += len(request.faces)
+
+            with self._stats_lock:
+                self._stats["requests"] += len(batch)
+                self._stats["faces"] += count
+                self._stats["batches"] += 1
+                self._stats["errors"] += error is not None
+                self._stats["total_queue_wait_ms"] += sum((started - r.enqueued) * 1000 for r in batch)
+                self._stats["total_inference_ms"] += (finished - started) * 1000
+
+    def metrics(self):
+        """Snapshot of queue depth and batching counters."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        batches = stats["batches"] or 1
+        requests = stats["requests"] or 1
+        return {
+            "queue_depth": self._queue.qsize(),
+            "queue_capacity": self._queue.maxsize,
+            "max_queue_depth": stats["max_queue_depth"],
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000,
+            "workers": len(self._workers),
+            "interpreter_threads": getattr(self.embedder, "num_threads", None),
+            "xnnpack": getattr(self.embedder, "use_xnnpack", None),
+            "requests": stats["requests"],
+            "faces": stats["faces"],
+            "batches": stats["batches"],
+            "rejected": stats["rejected"],
+            "errors": stats["errors"],
+            "avg_batch_size": round(stats["faces"] / batches, 2),
+            "avg_queue_wait_ms": round(stats["total_queue_wait_ms"] / requests, 3),
+            "avg_inference_ms": round(stats["total_inference_ms"] / batches, 3),
+        }
+
+
+_scheduler = None
+_scheduler_pid = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """
+    Return the process-wide scheduler, creating it on first use.
+
+    Worker threads do not survive fork(), so a process forked after
+    the scheduler was created (e.g. a preloaded Gunicorn worker) builds its
+    own.
+    """
+    global _scheduler, _scheduler_pid
+    if _scheduler is None or _scheduler_pid != os.getpid():
+        with _scheduler_lock:
+            if _scheduler is None or _scheduler_pid != os.getpid():
+                pool = get_embedder()
+                _scheduler = EmbeddingScheduler(pool, workers=pool.size)
+                _scheduler_pid = os.getpid()
+    return _scheduler
@@ -1,12 +1,21 @@
+import io
 import os
 import sys
-import tempfile
+import time
 import logging
 import json
+import shutil
+import tempfile
 import requests
-from flask import Flask, request, jsonify
-from authenticate_face import authenticate_from_json, detect_and_extract_face_from_path
-import cv2
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+from flask import Flask, Response, request, jsonify, stream_with_context
+from authenticate_face import authenticate_image, authenticate_image_faces, decode_image_bytes
+from face_gallery import get_gallery
+from inference_scheduler import get_scheduler
+from osint_client import get_osint_client
+from result_cache import ResultCache, result_cache_key
+from upload_request import InMemoryUploadRequest
+from video_identify import VIDEO_SAMPLE_FPS, identify_video
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -14,34 +23,144 @@ load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '..', '.env'))
 
 # Add metadata folder to path to import extract module
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'metadata'))
-from extract import get_image_metadata
+from extract import LazyMetadata, get_image_metadata_dict
+from geocode_cache import get_geocode_cache
 
 # Setup Flask app
 app = Flask(__name__)
+# Keep uploaded images in memory rather than spooling them to disk
+app.request_class = InMemoryUploadRequest
 
-# Setup logging
+# Setup logging; LOG_LEVEL=DEBUG also logs the extracted image metadata
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
 logging.basicConfig(
-    level=logging.DEBUG,
+    level=getattr(logging, LOG_LEVEL, logging.INFO),
     format="%(asctime)s [%(levelname)s] %(message)s",
     handlers=[logging.StreamHandler()]
 )
 
 # Load configuration from environment variables
 NODE_SERVER_URL = os.getenv('NODE_SERVER_URL', 'http://localhost:3000/api/search')
+NODE_BULK_SEARCH_URL = os.getenv('NODE_BULK_SEARCH_URL', NODE_SERVER_URL.rstrip('/') + '/bulk')
+# Directory /video may read local clips from; empty disables the "path" input
+VIDEO_PATH_ROOT = os.getenv('VIDEO_PATH_ROOT', '')
 API_KEY = os.getenv('API_KEY')
+# Time budgets (seconds from request arrival) for the /overall stages
+METADATA_TIMEOUT = float(os.getenv('OVERALL_METADATA_TIMEOUT', '12'))
+FACE_TIMEOUT = float(os.getenv('OVERALL_FACE_TIMEOUT', '30'))
+OSINT_TIMEOUT = float(os.getenv('OVERALL_OSINT_TIMEOUT', '60'))
+# Threads running /overall stages across all concurrent requests
+STAGE_WORKERS = int(os.getenv('OVERALL_STAGE_WORKERS', '16'))
 
 if not API_KEY:
     logging.warning("API_KEY not found in environment variables. Authentication may fail.")
 
+# Load the face gallery and embedding model once at startup; requests
+# reuse the resident copies
+get_gallery()
+get_scheduler()
+
+stage_executor = ThreadPoolExecutor(max_workers=STAGE_WORKERS, thread_name_prefix='overall-stage')
+
 NODE_HEADERS = {
     "x-api-key": API_KEY,
     "Content-Type": "application/json"
 }
 
+# Finished /overall responses, keyed by upload hash, location, gallery and model version
+result_cache = ResultCache()
+
+# Pooled keep-alive connections, timeouts, retries and a circuit breaker
+# for every call to the Node server
+get_osint_client(NODE_HEADERS)
+
+def _elapsed_ms(start):
+    return round((time.perf_counter() - start) * 1000, 2)
+
+
+def _finish_timings(timings, request_start):
+    """Add the total request time to the per-stage timings and log them."""
+    timings["total_ms"] = _elapsed_ms(request_start)
+    logging.info(f"Stage timings (ms): {timings}")
+    return timings
+
+
+def _is_truthy(value):
+    return str(value).strip().lower() in ("1", "true", "yes", "on")
+
+
+def _extract_metadata(image_bytes, filename):
+    """Metadata stage: EXIF extraction and geocoding. Returns (metadata or None, timings)."""
+    timings = {}
+    stage_start = time.perf_counter()
+    metadata = None
+    try:
+        img_buffer = io.BytesIO(image_bytes)
+        img_buffer.name = filename
+        metadata = get_image_metadata_dict(img_buffer)
+        # Serialized only when DEBUG records are actually emitted
+        logging.debug("Extracted image metadata: %s", LazyMetadata(metadata))
+    except Exception as meta_error:
+        logging.warning(f"Failed to extract metadata: {meta_error}")
+    timings["metadata_ms"] = _elapsed_ms(stage_start)
+    return metadata, timings
+
+
+def _identify_faces(image_bytes, location, multi_face):
+    """Face stage: decode once, then detect, embed and match. Returns (result, timings)."""
+    timings = {}
+    stage_start = time.perf_counter()
+    image = decode_image_bytes(image_bytes)
+    timings["decode_ms"] = _elapsed_ms(stage_start)
+    if multi_face:
+        # One batched embedding call and one matrix product for all faces
+        result = authenticate_image_faces(image, location, timings)
+    else:
+        result = authenticate_image(image, location, timings)
+    timings["face_ms"] = _elapsed_ms(stage_start)
+    return result, timings
+
+
+def _await_stage(future, deadline, stage, timings, default):
+    """
+    Wait for a stage until its deadline and merge its timings.
+
+    A stage that misses its budget is recorded in timings["timed_out"] and
+    default is used instead; its thread finishes in the background.
+    """
+    try:
+        result, stage_timings = future.result(timeout=max(0.0, deadline - time.perf_counter()))
+    except FuturesTimeout:
+        logging.warning(f"{stage} stage exceeded its time budget")
+        timings.setdefault("timed_out", []).append(stage)
+        return default
+    except Exception as e:
+        logging.error(f"{stage} stage failed: {e}")
+        return default
+    timings.update(stage_timings)
+    return result
+
+
 @app.route('/overall', methods=['POST'])
 def authenticate():
-    """Authenticate a person from image via multipart/form-data input and call Node server."""
+    """
+    Authenticate a person from image via multipart/form-data input and call Node server.
+
+    Metadata extraction (EXIF + geocoding) and face identification run
+    concurrently on the stage pool, each within its own time budget. The
+    OSINT call waits for the metadata (at most until METADATA_TIMEOUT from
+    request arrival) so the report saved by the Node server always carries
+    it; metadata that misses its budget is sent as null and the request is
+    flagged in timings["timed_out"].
+
+    With multi_face=true (form field or query parameter) every face in the
+    image is identified and all matched names are searched with one bulk
+    call to the Node server; the response then carries a "faces" list of
+    {bbox, name, score}.
+    """
     location = ""
+    request_start = time.perf_counter()
+    timings = {}
     try:
         if 'image' not in request.files:
             logging.warning("No image file in request")
@@ -49,73 +168,91 @@ def authenticate():
 
         image_file = request.files['image']
         location = request.form.get('location', '')
-        logging.info(f"Received image: {image_file.filename}, Location: {location}")
-
-        # Ensure a valid file extension
-        _, ext = os.path.splitext(image_file.filename)
-        if ext.lower() not in [".jpg", ".jpeg", ".png", ".bmp", ".webp"]:
-            ext = ".jpg"
-            logging.info(f"Invalid extension detected, defaulting to {ext}")
-
-        # Save uploaded image temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix=ext) as tmp_file:
-            image_path = tmp_file.name
-            image_file.save(image_path)
-        logging.info(f"Saved temp image to: {image_path}")
-
-        # Extract metadata from image
-        metadata = None
-        try:
-            with open(image_path, 'rb') as img_file:
-                metadata_json = get_image_metadata(img_file)
-                metadata = json.loads(metadata_json)
-                logging.info(f"Extracted image metadata: {json.dumps(metadata, indent=2)}")
-        except Exception as meta_error:
-            logging.warning(f"Failed to extract metadata: {meta_error}")
-            metadata = None
-
-        # Extract embedding / name
-        embedding, message = detect_and_extract_face_from_path(image_path)
-        logging.info(f"Face detection message: {message}")
-
-        result = authenticate_from_json({"image_path": image_path, "location": location})
-        name = result.get("name")
-        logging.info(f"Extracted Name: {name}")
-
-        # Remove temp image
-        if os.path.exists(image_path):
-            os.remove(image_path)
-            logging.info(f"Removed temp image file: {image_path}")
-
-        # Prepare payload with name, location, and metadata
-        payload = {
-            "name": name,
-            "location": location,
-            "metadata": metadata
-        }
-
-        # Call Node.js server with extracted name, location, and metadata
-        # Even if name is None, still call the server to get metadata in response
+        multi_face = _is_truthy(request.form.get('multi_face', request.args.get('multi_face', '')))
+        logging.info(f"Received image: {image_file.filename}, Location: {location}, Multi-face: {multi_face}")
+
+        # Keep the upload in memory; PIL and OpenCV both read the same bytes
+        image_bytes = image_file.read()
+        logging.info(f"Read {len(image_bytes)} bytes from upload")
+
+        # A repeat submission of the same photo is answered from the cache
+        # until the gallery (or model) changes
+        cache_key = result_cache_key(image_bytes, location, get_gallery().snapshot().version, multi_face)
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            body, status = cached
+            logging.info("Serving cached response")
+            return jsonify({**body, "cached": True, "timings": _finish_timings(timings, request_start)}), status
+
+        # Metadata and face identification are independent; run them side by side
+        metadata_future = stage_executor.submit(_extract_metadata, image_bytes, image_file.filename)
+        face_future = stage_executor.submit(_identify_faces, image_bytes, location, multi_face)
+        metadata_deadline = request_start + METADATA_TIMEOUT
+
+        if multi_face:
+            faces = _await_stage(face_future, request_start + FACE_TIMEOUT, "face", timings,
+                                 {"faces": []})["faces"]
+            names = list(dict.fromkeys(face["name"] for face in faces if face["name"]))
+            logging.info(f"Extracted Names: {names}")
+            node_url = NODE_BULK_SEARCH_URL
+            payload = {"names": names, "location": location}
+            local_response = {"faces": faces, "names": names, "location": location}
+        else:
+            result = _await_stage(face_future, request_start + FACE_TIMEOUT, "face", timings, {"name": None})
+            name = result.get("name")
+            logging.info(f"Extracted Name: {name}")
+            # Even if name is None, still call the server to get metadata in response
+            node_url = NODE_SERVER_URL
+            payload = {"name": name, "location": location}
+            local_response = dict(payload)
+
+        # The Node server stores the report it builds from this payload, so
+        # wait for the metadata (it has been running alongside the face
+        # stage) rather than posting without it
+        metadata = _await_stage(metadata_future, metadata_deadline, "metadata", timings, None)
+        payload["metadata"] = metadata
+
+        def cache_response(body, status):
+            """Remember complete, successful responses only."""
+            if status == 200 and "timed_out" not in timings and "error" not in body:
+                result_cache.put(cache_key, (dict(body), status))
+
+        if multi_face and not names:
+            local_response["metadata"] = metadata
+            cache_response(local_response, 200)
+            return jsonify({**local_response, "timings": _finish_timings(timings, request_start)}), 200
+
+        # Call Node.js server with extracted name(s), location, and metadata
+        stage_start = time.perf_counter()
         try:
-            node_response = requests.post(NODE_SERVER_URL, headers=NODE_HEADERS, json=payload)
+            node_response = get_osint_client(NODE_HEADERS).post(node_url, payload, read_timeout=OSINT_TIMEOUT)
             data = node_response.json()
+            timings["osint_ms"] = _elapsed_ms(stage_start)
+            if isinstance(data, dict):
+                if multi_face:
+                    data["faces"] = local_response["faces"]
+                cache_response(data, node_response.status_code)
+                data["timings"] = _finish_timings(timings, request_start)
             return jsonify(data), node_response.status_code
-        except requests.exceptions.ConnectionError:
-            logging.error("Failed to connect to Node.js server")
+        except requests.exceptions.ConnectionError as e:
+            # Also raised at once, without a request, while the circuit breaker is open
+            logging.error(f"Failed to connect to Node.js server: {e}")
+            timings["osint_ms"] = _elapsed_ms(stage_start)
             # Return local response with metadata if Node server is down
             return jsonify({
-                "name": name,
-                "location": location,
+                **local_response,
                 "metadata": metadata,
+                "timings": _finish_timings(timings, request_start),
                 "error": "OSINT service unavailable"
             }), 200
         except Exception as e:
             logging.error(f"Failed to communicate with Node server: {e}")
+            timings["osint_ms"] = _elapsed_ms(stage_start)
             # Return local response with metadata on any error
             return jsonify({
-                "name": name,
-                "location": location,
+                **local_response,
                 "metadata": metadata,
+                "timings": _finish_timings(timings, request_start),
                 "error": f"OSINT service error: {str(e)}"
             }), 200
 
@@ -124,6 +261,79 @@ def authenticate():
         return jsonify({"error": str(e)}), 500
 
 
+def _remove_temp_file(path):
+    try:
+        os.remove(path)
+    except OSError as e:
+        logging.warning(f"Could not remove temporary file {path}: {e}")
+
+
+@app.route('/video', methods=['POST'])
+def identify_video_stream():
+    """
+    Identify the faces in a video clip, streaming results as NDJSON.
+
+    The clip is either a multipart 'video' upload (spooled to a temporary
+    file in chunks) or a 'path' inside VIDEO_PATH_ROOT. 'fps' sets how many
+    frames per second are analysed. Each tracked face is embedded once and
+    reported as soon as it is matched; a final summary line follows.
+    """
+    fps = request.form.get('fps', request.args.get('fps', VIDEO_SAMPLE_FPS))
+    try:
+        fps = float(fps)
+    except ValueError:
+        return jsonify({"error": "fps must be a number"}), 400
+
+    temp_path = None
+    if 'video' in request.files:
+        video_file = request.files['video']
+        suffix = os.path.splitext(video_file.filename or '')[1] or '.mp4'
+        with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as temp_file:
+            shutil.copyfileobj(video_file.stream, temp_file, 1024 * 1024)
+            temp_path = temp_file.name
+        source = temp_path
+    else:
+        path = request.form.get('path') or (request.get_json(silent=True) or {}).get('path')
+        if not path:
+            return jsonify({"error": "No video file or path provided"}), 400
+        if not VIDEO_PATH_ROOT:
+            return jsonify({"error": "Reading local video paths is disabled"}), 403
+        source = os.path.realpath(os.path.join(VIDEO_PATH_ROOT, path))
+        if os.path.commonpath([source, os.path.realpath(VIDEO_PATH_ROOT)]) != os.path.realpath(VIDEO_PATH_ROOT):
+            return jsonify({"error": "Path outside VIDEO_PATH_ROOT"}), 403
+        if not os.path.isfile(source):
+            return jsonify({"error": "Video not found"}), 404
+
+    logging.info(f"Identifying faces in video {source} at {fps} fps")
+
+    def generate():
+        try:
+            for event in identify_video(source, sample_fps=fps):
+                yield json.dumps(event) + "\n"
+        except Exception as e:
+            logging.exception("Error during video identification")
+            yield json.dumps({"event": "error", "error": str(e)}) + "\n"
+
+    response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    if temp_path:
+        # Runs when the response is closed, even if the client went away
+        # before the generator was ever started
+        response.call_on_close(lambda: _remove_temp_file(temp_path))
+    return response
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Expose inference queue and batching counters, OSINT client health and cache hit rates."""
+    geocode_cache = get_geocode_cache()
+    return jsonify({
+        "inference": get_scheduler().metrics(),
+        "osint": get_osint_client(NODE_HEADERS).metrics(),
+        "result_cache": result_cache.metrics(),
+        "geocode_cache": geocode_cache.metrics() if geocode_cache is not None else None,
+    }), 200
+
+
 if __name__ == '__main__':
     logging.info("Starting Face Authentication API on port 5000...")
     app.run(debug=False, host='0.0.0.0', port=5000)
@@ -48,24 +48,28 @@
 
 # if __name__ == '__main__':
 #     app.run(debug=False, host='0.0.0.0', port=5000)import os
-import tempfile
-import os
 import logging
 from flask import Flask, request, jsonify
-from authenticate_face import authenticate_from_json, detect_and_extract_face_from_path
-import cv2
-import json
+from authenticate_face import authenticate_image, decode_image_bytes
+from face_gallery import get_gallery
+from upload_request import InMemoryUploadRequest
 
 # Setup Flask app
 app = Flask(__name__)
+# Keep uploaded images in memory rather than spooling them to disk
+app.request_class = InMemoryUploadRequest
 
-# Setup logging
+# Setup logging (LOG_LEVEL, default INFO)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
 logging.basicConfig(
-    level=logging.DEBUG,
+    level=getattr(logging, LOG_LEVEL, logging.INFO),
     format="%(asctime)s [%(levelname)s] %(message)s",
     handlers=[logging.StreamHandler()]
 )
 
+# Load the face gallery once at startup; requests reuse the resident copy
+get_gallery()
+
 @app.route('/authenticate', methods=['POST'])
 def authenticate():
     """Authenticate a person from image via multipart/form-data input with full logging."""
@@ -80,60 +84,29 @@ def authenticate():
         location = request.form.get('location', '')
         logging.info(f"Received image: {image_file.filename}, Location: {location}")
 
-        # Ensure a valid file extension
-        _, ext = os.path.splitext(image_file.filename)
-        if ext.lower() not in [".jpg", ".jpeg", ".png", ".bmp", ".webp"]:
-            ext = ".jpg"
-            logging.info(f"Invalid extension detected, defaulting to {ext}")
-
-        # Save the uploaded image temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix=ext) as tmp_file:
-            image_path = tmp_file.name
-            image_file.save(image_path)
-            tmp_file.flush()
-        logging.info(f"Saved temp image to: {image_path}")
-
-        # Test if OpenCV can read the image
-        test_img = cv2.imread(image_path)
-        if test_img is None:
-            logging.error(f"OpenCV failed to read image at {image_path}")
-        else:
-            logging.info(f"Image read successfully with shape: {test_img.shape}")
-
-        # Optional: Debug face detection and embedding directly
-        embedding, message = detect_and_extract_face_from_path(image_path)
-        logging.info(f"Face detection message: {message}")
-        if embedding is not None:
-            logging.info(f"Embedding shape: {embedding.shape}")
+        # Decode the upload straight from memory, once; detection and
+        # embedding reuse the decoded image
+        image = decode_image_bytes(image_file.read())
+        if image is None:
+            logging.error(f"OpenCV failed to decode uploaded image {image_file.filename}")
         else:
-            logging.warning("No embedding generated")
-
-        # Prepare data for your existing function
-        input_data = {"image_path": image_path, "location": location, "save_report": False}
-
-        # Load face database for debugging
-        try:
-            with open("face_database.json", 'r') as f:
-                face_db = json.load(f)
-            logging.info(f"Loaded face database with {len(face_db)} entries")
-        except Exception as e:
-            logging.error(f"Failed to load face database: {e}")
-            face_db = {}
+            logging.info(f"Image read successfully with shape: {image.shape}")
 
-        # Call your existing authentication function
-        result = authenticate_from_json(input_data)
-        logging.info(f"Authentication result: {result}")
+        # Report the resident face gallery size for debugging
+        face_db = get_gallery().snapshot()
+        logging.info(f"Face gallery has {len(face_db)} entries (version {face_db.version})")
 
-        # Remove temporary image file
-        if os.path.exists(image_path):
-            os.remove(image_path)
-            logging.info(f"Removed temp image file: {image_path}")
+        # Detect, embed and match on the decoded image
+        timings = {}
+        result = authenticate_image(image, location, timings)
+        logging.info(f"Authentication result: {result}, stage timings (ms): {timings}")
 
         # Remove save_report key if exists (just in case)
         if 'save_report' in result:
             result.pop('save_report')
 
-        # Return result without save_report
+        # Return result without save_report, with per-stage timings
+        result["timings"] = timings
         return jsonify(result), 200
 
     except Exception as e:
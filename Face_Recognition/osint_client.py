@@ -0,0 +1,200 @@
+import os
+import time
+import random
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+# Seconds to establish a connection / to wait for the report
+CONNECT_TIMEOUT = float(os.getenv("OSINT_CONNECT_TIMEOUT", "3"))
+READ_TIMEOUT = float(os.getenv("OSINT_READ_TIMEOUT", "60"))
+# Extra attempts after a connection that could not be established or a 503,
+# and the base of their exponential backoff (seconds, full jitter)
+MAX_RETRIES = int(os.getenv("OSINT_RETRIES", "2"))
+BACKOFF_BASE = float(os.getenv("OSINT_BACKOFF", "0.2"))
+# Keep-alive connections kept per host
+POOL_SIZE = int(os.getenv("OSINT_POOL_SIZE", "32"))
+# Consecutive failures that open the breaker, and seconds before it lets a
+# trial request through
+BREAKER_THRESHOLD = int(os.getenv("OSINT_BREAKER_THRESHOLD", "5"))
+BREAKER_RESET = float(os.getenv("OSINT_BREAKER_RESET", "30"))
+
+# Only "not accepted" statuses: a 502/504 from a gateway can arrive after
+# Node has already started building (and saving) the report
+RETRY_STATUSES = (503,)
+
+
+class OSINTUnavailable(requests.exceptions.ConnectionError):
+    """Raised without contacting the OSINT service while its circuit breaker is open."""
+
+
+def _never_sent(error):
+    """True when a ConnectionError happened before the request reached the server."""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    closed: requests flow. After threshold consecutive failures it opens and
+    rejects requests for reset_after seconds; then one trial request is let
+    through (half-open), whose outcome closes or re-opens the breaker.
+    """
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, reset_after=BREAKER_RESET):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+        self.times_opened = 0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_after:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_running or (self.opened_at is None and self.failures >= self.threshold):
+                if self.opened_at is None:
+                    self.times_opened += 1
+                self.opened_at = time.monotonic()
+            self._trial_running = False
+
+
+class OSINTClient:
+    """
+    Shared HTTP client for the Node OSINT service.
+
+    One requests.Session keeps up to pool_size keep-alive connections, so
+    requests reuse TCP connections instead of reconnecting. Every call has
+    connect/read timeouts. Only failures where the request never reached
+    Node (connection refused, DNS failure, connect timeout) and 503s are
+    retried, with jittered exponential backoff. A connection reset after
+    the body was sent or a read timeout is not, since POSTs create reports.
+    Repeated failures open the circuit breaker, after which post() raises
+    OSINTUnavailable immediately.
+    """
+
+    def __init__(self, headers=None, connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT,
+                 max_retries=MAX_RETRIES, backoff_base=BACKOFF_BASE, pool_size=POOL_SIZE, breaker=None):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        if headers:
+            self.session.headers.update(headers)
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.breaker = breaker or CircuitBreaker()
+        self._stats_lock = threading.Lock()
+        self._stats = {"requests": 0, "retries": 0, "failures": 0, "rejected": 0}
+
+    def _count(self, key):
+        with self._stats_lock:
+            self._stats[key] += 1
+
+    def post(self, url, payload, read_timeout=None):
+        """POST payload as JSON and return the response; raises requests exceptions on failure."""
+        if not self.breaker.allow():
+            self._count("rejected")
+            raise OSINTUnavailable(f"OSINT circuit breaker is open ({url})")
+
+        self._count("requests")
+        timeout = (self.connect_timeout, read_timeout or self.read_timeout)
+        attempt = 0
+        try:
+            while True:
+                try:
+                    response = self.session.post(url, json=payload, timeout=timeout)
+                except requests.exceptions.ConnectionError as e:
+                    if _never_sent(e) and attempt < self.max_retries:
+                        attempt = self._backoff(attempt)
+                        continue
+                    raise
+                if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                    attempt = self._backoff(attempt)
+                    continue
+                break
+        except BaseException:
+            # Whatever the error (timeouts, broken chunked bodies, an
+            # unserializable payload), record it so a half-open trial
+            # request can never leave the breaker stuck open
+            self._fail()
+            raise
+
+        if response.status_code >= 500:
+            self._fail()
+        else:
+            self.breaker.record_success()
+        return response
+
+    def _backoff(self, attempt):
+        self._count("retries")
+        time.sleep(random.uniform(0, self.backoff_base * (2 ** attempt)))
+        return attempt + 1
+
+    def _fail(self):
+        self._count("failures")
+        self.breaker.record_failure()
+
+    def metrics(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats.update({
+            "breaker_state": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "breaker_opened": self.breaker.times_opened,
+        })
+        return stats
+
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_osint_client(headers=None):
+    """
+    Return the process-wide OSINT client, creating it on first use.
+
+    Pooled connections must not be shared across fork(), so a forked worker
+    builds its own client.
+    """
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        with _client_lock:
+            if _client is None or _client_pid != os.getpid():
+                _client = OSINTClient(headers=headers)
+                _client_pid = os.getpid()
+    return _client
@@ -1,49 +1,29 @@
 import os
-import warnings
-# Set environment variables before importing TensorFlow
-os.environ["TF_ENABLE_ONEDNN_OPTS"] = "0"
-os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
 
+import argparse
 import cv2
 import numpy as np
-import tensorflow as tf
 import time
 import json
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from pathlib import Path
 
-# Suppress TensorFlow Lite deprecation warnings
-warnings.filterwarnings("ignore", category=UserWarning, module="tensorflow.lite.python.interpreter")
+from embedding_cache import EMBEDDING_CACHE_PATH, EmbeddingCache, hash_file
+from embedding_store import database_to_arrays, store_paths
+from face_detector import detect_faces, detector_signature
+from face_index import ANN_MIN_SIZE, build_index_for_gallery
+from face_model import EMBEDDING_BATCH_SIZE, PREPROCESS_VERSION, configure_embedder, embed_faces
+from gallery_log import (add_op, append_mutations, load_state, log_path_for, maybe_compact,
+                         state_to_database, write_snapshot)
 
-# Load FaceNet model
-MODEL_PATH = "mobilefacenet.tflite"
-interpreter = tf.lite.Interpreter(model_path=MODEL_PATH)
-interpreter.allocate_tensors()
-input_details = interpreter.get_input_details()
-output_details = interpreter.get_output_details()
-
-# Load Haarcascade for face detection
-face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
-
-def preprocess_face(face):
-    # Convert to tensor if not already
-    face = tf.image.resize(face, [112, 112])
-    face = tf.cast(face, tf.float32) / 255.0
-    face = tf.expand_dims(face, axis=0)
-    return face
 
 
 def extract_face_embedding(face):
-    face = preprocess_face(face)
-    # Convert tensor to numpy array for TFLite interpreter
-    face_numpy = face.numpy()
-    interpreter.set_tensor(input_details[0]['index'], face_numpy)
-    interpreter.invoke()
-    embedding = interpreter.get_tensor(output_details[0]['index'])
-    return embedding.flatten()
+    return embed_faces([face])[0]
 
 
-def detect_and_extract_face(image_path):
-    """Detect face in image and extract embedding."""
+def detect_face_crop(image_path):
+    """Detect the largest face in an image and return its crop."""
     try:
         # Read image
         image = cv2.imread(image_path)
@@ -51,33 +31,36 @@ def detect_and_extract_face(image_path):
             print(f"Error: Could not read image {image_path}")
             return None
             
-        # Convert to grayscale for face detection
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        
-        # Detect faces
-        faces = face_cascade.detectMultiScale(gray, 1.3, 5)
+        # Detect faces (on a downscaled copy), largest first
+        faces = detect_faces(image)
         
         if len(faces) == 0:
             print(f"Warning: No face detected in {image_path}")
             return None
         elif len(faces) > 1:
             print(f"Warning: Multiple faces detected in {image_path}, using the largest one")
-            # Get the largest face
-            faces = sorted(faces, key=lambda x: x[2] * x[3], reverse=True)
         
         # Extract the first (or largest) face
         x, y, w, h = faces[0]
-        face = image[y:y + h, x:x + w]
-        
-        # Extract embedding
-        embedding = extract_face_embedding(face)
-        return embedding
+        return image[y:y + h, x:x + w]
         
     except Exception as e:
         print(f"Error processing {image_path}: {e}")
         return None
 
 
+def detect_and_extract_face(image_path):
+    """Detect face in image and extract embedding."""
+    face = detect_face_crop(image_path)
+    if face is None:
+        return None
+    try:
+        return extract_face_embedding(face)
+    except Exception as e:
+        print(f"Error processing {image_path}: {e}")
+        return None
+
+
 def get_supported_image_extensions():
     """Return list of supported image file extensions."""
     return ['.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.webp', '.tif']
@@ -95,71 +78,430 @@ def find_image_in_folder(folder_path):
     return None
 
 
-def register_faces_from_dataset(dataset_path="faces_dataset"):
-    """Register all faces from the dataset directory."""
+def find_images_in_folder(folder_path):
+    """Find every supported image file in a folder, in name order."""
+    supported_extensions = get_supported_image_extensions()
+    return sorted(
+        str(file_path) for file_path in Path(folder_path).iterdir()
+        if file_path.is_file() and file_path.suffix.lower() in supported_extensions
+    )
+
+
+def summarize_embeddings(embeddings, max_templates=0):
+    """
+    Reduce one identity's image embeddings to what the gallery stores.
+
+    max_templates=0 stores the normalized centroid (one flat list). Otherwise
+    up to max_templates representative templates are kept, picked by
+    farthest-point sampling starting from the embedding closest to the
+    centroid, and stored as a list of lists (flat when only one remains).
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    embeddings = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+    centroid = embeddings.mean(axis=0)
+    centroid /= max(np.linalg.norm(centroid), 1e-12)
+    if max_templates <= 0 or len(embeddings) == 1:
+        return centroid.tolist()
+
+    chosen = [int(np.argmax(embeddings @ centroid))]
+    closest = embeddings @ embeddings[chosen[0]]
+    while len(chosen) < min(max_templates, len(embeddings)):
+        candidate = int(np.argmin(closest))
+        if candidate in chosen:
+            break
+        chosen.append(candidate)
+        closest = np.maximum(closest, embeddings @ embeddings[candidate])
+    templates = embeddings[chosen]
+    return templates[0].tolist() if len(templates) == 1 else templates.tolist()
+
+
+def open_enrollment_cache(cache_path=EMBEDDING_CACHE_PATH):
+    """Open the enrollment embedding cache, or return None when disabled or unavailable."""
+    if not cache_path:
+        return None
+    try:
+        # Crops depend on the detector configuration as well as on preprocessing
+        return EmbeddingCache(cache_path, preprocess=f"{PREPROCESS_VERSION}/{detector_signature()}")
+    except Exception as e:
+        print(f"Warning: Embedding cache disabled: {e}")
+        return None
+
+
+def split_cached_images(image_paths, cache, force=False):
+    """
+    Look each image up in the enrollment cache by content hash.
+
+    Returns (cached_embeddings, uncached, hits): embeddings of cache hits
+    (cached "no face" hits contribute nothing), and (image_path, image_hash)
+    pairs that still have to be decoded and embedded. With force every
+    image is treated as a miss.
+    """
+    cached, uncached, hits = [], [], 0
+    for image_path in image_paths:
+        image_hash = hash_file(image_path) if cache is not None else None
+        if cache is not None and not force:
+            found, embedding = cache.get(image_hash)
+            if found:
+                hits += 1
+                if embedding is not None:
+                    cached.append(embedding)
+                continue
+        uncached.append((image_path, image_hash))
+    return cached, uncached, hits
+
+
+_worker_cache = None
+
+
+def _init_enrollment_worker(num_threads, cache_path=None, model_hash=None, preprocess=None):
+    """
+    Give each enrollment process its own single interpreter (the detector is
+    created on first use) and a read-only handle on the embedding cache.
+    """
+    global _worker_cache
+    configure_embedder(size=1, num_threads=num_threads)
+    if cache_path and os.path.exists(cache_path):
+        _worker_cache = EmbeddingCache(cache_path, preprocess=preprocess, model_hash=model_hash, readonly=True)
+
+
+def _enroll_chunk(folder_paths, max_templates=0, force=False):
+    """
+    Enroll a chunk of person folders inside a worker process.
+
+    Images found in the embedding cache are not decoded at all. Every
+    other image is decoded and detected first, then all found faces are
+    embedded in one batched call and summarized per person together with
+    the cached embeddings. Returns (results, cache_entries, hits, misses):
+    (name, embedding or None, note) tuples, and the new (image_hash,
+    embedding or None) pairs for the parent to store in the cache.
+    """
+    results = []
+    pending = []
+    cache_entries = []
+    hits = misses = 0
+    for folder_path in folder_paths:
+        name = Path(folder_path).name
+        image_paths = find_images_in_folder(folder_path)
+        if not image_paths:
+            results.append((name, None, "no supported image"))
+            continue
+        cached, uncached, folder_hits = split_cached_images(image_paths, _worker_cache, force)
+        hits += folder_hits
+        misses += len(uncached) if _worker_cache is not None else 0
+        faces, hashes = [], []
+        for image_path, image_hash in uncached:
+            face = detect_face_crop(image_path)
+            if face is not None:
+                faces.append(face)
+                hashes.append(image_hash)
+            elif image_hash is not None:
+                cache_entries.append((image_hash, None))
+        if not faces and not cached:
+            results.append((name, None, "no face detected"))
+            continue
+        pending.append((name, cached, faces, hashes))
+
+    all_faces = [face for _, _, faces, _ in pending for face in faces]
+    embeddings = []
+    if all_faces:
+        try:
+            embeddings = embed_faces(all_faces)
+        except Exception as e:
+            results.extend((name, None, f"embedding failed: {e}") for name, _, _, _ in pending)
+            return results, cache_entries, hits, misses
+
+    offset = 0
+    for name, cached, faces, hashes in pending:
+        new_embeddings = list(embeddings[offset:offset + len(faces)])
+        offset += len(faces)
+        cache_entries.extend((h, e) for h, e in zip(hashes, new_embeddings) if h is not None)
+        results.append((name, summarize_embeddings(cached + new_embeddings, max_templates), "ok"))
+    return results, cache_entries, hits, misses
+
+
+def load_enrollment_checkpoint(checkpoint_path):
+    """Return {name: embedding or None} for folders already handled by an earlier run (the latest record wins)."""
+    done = {}
+    if not checkpoint_path or not os.path.exists(checkpoint_path):
+        return done
+    with open(checkpoint_path, 'r') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A crash can leave a truncated last line; that folder is redone
+                continue
+            done[record["name"]] = record.get("embedding")
+    return done
+
+
+def completed_enrollments(checkpoint_path):
+    """Folders an earlier run registered successfully; failed ones are tried again."""
+    return {name: emb for name, emb in load_enrollment_checkpoint(checkpoint_path).items() if emb is not None}
+
+
+def _register_faces_parallel(dataset_dir, workers, checkpoint_path, batch_size, num_threads, max_templates,
+                             cache, force):
+    """
+    Enroll person folders across a process pool, checkpointing every finished chunk.
+
+    Workers only read the embedding cache; this process writes the entries
+    they computed.
+    """
+    done = completed_enrollments(checkpoint_path)
+    registered_faces = dict(done)
+    folders = sorted(str(p) for p in dataset_dir.iterdir() if p.is_dir() and p.name not in done)
+    total = len(folders) + len(done)
+
+    print(f"Processing faces from dataset: {dataset_dir} with {workers} workers")
+    if done:
+        print(f"♻️  Resuming from checkpoint: {len(done)} folders already processed")
+    print("=" * 50)
+
+    chunks = [folders[i:i + batch_size] for i in range(0, len(folders), batch_size)]
+    processed = len(done)
+    failed = 0
+    hits = misses = 0
+    start = time.time()
+
+    checkpoint = open(checkpoint_path, 'a') if checkpoint_path else None
+    try:
+        initargs = (num_threads,)
+        if cache is not None:
+            initargs += (cache.path, cache.model_hash, cache.preprocess)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_enrollment_worker,
+                                 initargs=initargs) as executor:
+            chunk_iter = iter(chunks)
+            in_flight = set()
+            # Keep a couple of chunks queued per worker so no process idles
+            for chunk in chunk_iter:
+                in_flight.add(executor.submit(_enroll_chunk, chunk, max_templates, force))
+                if len(in_flight) >= workers * 2:
+                    break
+
+            while in_flight:
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    results, cache_entries, chunk_hits, chunk_misses = future.result()
+                    hits += chunk_hits
+                    misses += chunk_misses
+                    if cache is not None and cache_entries:
+                        cache.put_many(cache_entries)
+                    for name, embedding, note in results:
+                        processed += 1
+                        if embedding is not None:
+                            registered_faces[name] = embedding
+                        else:
+                            failed += 1
+                            print(f"  ❌ Failed to register {name}: {note}")
+                        if checkpoint:
+                            checkpoint.write(json.dumps({"name": name, "embedding": embedding, "note": note}) + "\n")
+                    if checkpoint:
+                        checkpoint.flush()
+
+                    next_chunk = next(chunk_iter, None)
+                    if next_chunk is not None:
+                        in_flight.add(executor.submit(_enroll_chunk, next_chunk, max_templates, force))
+
+                elapsed = time.time() - start
+                rate = (processed - len(done)) / elapsed if elapsed > 0 else 0.0
+                remaining = (total - processed) / rate if rate > 0 else 0.0
+                print(f"  📈 {processed}/{total} folders, {rate:.1f} folders/s, ETA {remaining:.0f}s")
+    finally:
+        if checkpoint:
+            checkpoint.close()
+
+    print("=" * 50)
+    print(f"Registration Summary:")
+    print(f"Total folders processed: {total}")
+    print(f"Successfully registered: {len(registered_faces)}")
+    print(f"Failed: {failed}")
+    print(f"Throughput: {(processed - len(done)) / max(time.time() - start, 1e-9):.1f} folders/s")
+    if cache is not None:
+        print(f"Embedding cache: {hits} hits, {misses} misses")
+
+    return registered_faces
+
+
+def register_faces_from_dataset(dataset_path="faces_dataset", workers=1, checkpoint_path=None,
+                                batch_size=EMBEDDING_BATCH_SIZE, num_threads=1, max_templates=0,
+                                cache_path=EMBEDDING_CACHE_PATH, force=False):
+    """
+    Register all faces from the dataset directory.
+
+    Every image in a person folder is embedded; the identity is stored as
+    the normalized centroid, or as up to max_templates representative
+    templates (see summarize_embeddings).
+
+    With workers > 1 the folders are enrolled by a process pool, each
+    worker owning its own interpreter and cascade. checkpoint_path names a
+    JSON Lines file recording every finished folder, in either mode;
+    rerunning with the same path skips the folders registered successfully
+    and tries the failed ones again, so an interrupted run resumes.
+
+    Embeddings are cached by image content hash in cache_path (None
+    disables the cache), so unchanged images are neither decoded nor
+    embedded again; force recomputes (and re-caches) every image.
+    """
     dataset_dir = Path(dataset_path)
     
     if not dataset_dir.exists():
         print(f"Error: Dataset directory '{dataset_path}' not found.")
         return {}
-    
-    print(f"Processing faces from dataset: {dataset_path}")
+
+    cache = open_enrollment_cache(cache_path)
+    try:
+        if workers > 1:
+            return _register_faces_parallel(dataset_dir, workers, checkpoint_path, batch_size, num_threads,
+                                            max_templates, cache, force)
+        return _register_faces_sequential(dataset_dir, checkpoint_path, batch_size, max_templates, cache, force)
+    finally:
+        if cache is not None:
+            cache.close()
+
+
+def _register_faces_sequential(dataset_dir, checkpoint_path, batch_size, max_templates, cache, force):
+    """
+    Enroll person folders in this process, embedding uncached faces batch_size at a time.
+
+    A folder is written to the checkpoint once all of its faces have been
+    embedded, so an interrupted run resumes after the last finished folder.
+    """
+    done = completed_enrollments(checkpoint_path)
+    print(f"Processing faces from dataset: {dataset_dir}")
+    if done:
+        print(f"♻️  Resuming from checkpoint: {len(done)} folders already registered")
     print("=" * 50)
     
-    registered_faces = {}
-    success_count = 0
-    total_folders = 0
+    registered_faces = dict(done)
+    total_folders = len(done)
+    pending = []
+    person_embeddings = {}
+    cache_entries = []
+    hits = misses = 0
+    # Folders whose faces are all detected; done once the queue is embedded
+    finished = []
+    checkpoint = open(checkpoint_path, 'a') if checkpoint_path else None
+
+    def record_finished():
+        """Register (or fail) every finished folder and checkpoint it."""
+        for person_name, failure in finished:
+            embeddings = person_embeddings.pop(person_name, None)
+            embedding = summarize_embeddings(embeddings, max_templates) if embeddings else None
+            if embedding is not None:
+                registered_faces[person_name] = embedding
+                print(f"  ✅ Successfully registered {person_name} from {len(embeddings)} face(s)")
+            else:
+                print(f"  ❌ Failed to register {person_name}: {failure}")
+            if checkpoint:
+                checkpoint.write(json.dumps({"name": person_name, "embedding": embedding,
+                                             "note": "ok" if embedding is not None else failure}) + "\n")
+        finished.clear()
+        if checkpoint:
+            checkpoint.flush()
+
+    def flush_pending():
+        """Embed the queued face crops in one batched model call."""
+        if not pending:
+            return
+        try:
+            embeddings = embed_faces([face for _, face, _ in pending])
+        except Exception as e:
+            print(f"  ❌ Batch embedding failed: {e}")
+            pending.clear()
+            return
+        for (name, _, image_hash), embedding in zip(pending, embeddings):
+            person_embeddings.setdefault(name, []).append(embedding)
+            if image_hash is not None:
+                cache_entries.append((image_hash, embedding))
+        pending.clear()
+        if cache is not None:
+            cache.put_many(cache_entries)
+            cache_entries.clear()
+        record_finished()
     
-    # Process each folder in the dataset
-    for person_folder in dataset_dir.iterdir():
-        if not person_folder.is_dir():
-            continue
-            
-        total_folders += 1
-        person_name = person_folder.name
-        
-        print(f"Processing: {person_name}")
-        
-        # Find image in the folder
-        image_path = find_image_in_folder(person_folder)
-        
-        if image_path is None:
-            print(f"  ❌ No supported image found in {person_folder}")
-            continue
-        
-        print(f"  📁 Found image: {Path(image_path).name}")
-        
-        # Extract face embedding
-        embedding = detect_and_extract_face(image_path)
-        
-        if embedding is not None:
-            registered_faces[person_name] = embedding.tolist()
-            success_count += 1
-            print(f"  ✅ Successfully registered {person_name}")
-        else:
-            print(f"  ❌ Failed to register {person_name}")
-        
-        print()
+    # Process each folder in the dataset; detected faces of every image are
+    # queued and embedded batch_size at a time
+    try:
+        for person_folder in sorted(dataset_dir.iterdir()):
+            if not person_folder.is_dir() or person_folder.name in done:
+                continue
+
+            total_folders += 1
+            person_name = person_folder.name
+
+            print(f"Processing: {person_name}")
+
+            # Find images in the folder
+            image_paths = find_images_in_folder(person_folder)
+
+            if not image_paths:
+                print(f"  ❌ No supported image found in {person_folder}")
+                finished.append((person_name, "no supported image"))
+                continue
+
+            print(f"  📁 Found {len(image_paths)} image(s)")
+
+            # Unchanged images come straight from the cache
+            cached, uncached, folder_hits = split_cached_images(image_paths, cache, force)
+            hits += folder_hits
+            misses += len(uncached) if cache is not None else 0
+            if cached:
+                person_embeddings.setdefault(person_name, []).extend(cached)
+
+            # Detect the faces; embedding happens once the batch is full
+            for image_path, image_hash in uncached:
+                face = detect_face_crop(image_path)
+                if face is not None:
+                    pending.append((person_name, face, image_hash))
+                    if len(pending) >= batch_size:
+                        flush_pending()
+                elif image_hash is not None:
+                    cache_entries.append((image_hash, None))
+
+            finished.append((person_name, "no face detected"))
+            # Nothing queued: the folder (and any before it) is complete now
+            if not pending:
+                record_finished()
+            print()
+
+        flush_pending()
+        record_finished()
+        if cache is not None and cache_entries:
+            cache.put_many(cache_entries)
+    finally:
+        if checkpoint:
+            checkpoint.close()
     
     print("=" * 50)
     print(f"Registration Summary:")
     print(f"Total folders processed: {total_folders}")
-    print(f"Successfully registered: {success_count}")
-    print(f"Failed: {total_folders - success_count}")
+    print(f"Successfully registered: {len(registered_faces)}")
+    print(f"Failed: {total_folders - len(registered_faces)}")
+    if cache is not None:
+        print(f"Embedding cache: {hits} hits, {misses} misses")
     
     return registered_faces
 
 
-def save_face_database(database, db_file="face_database.json"):
-    """Save face database to a file."""
+def save_face_database(database, db_file="face_database.json", export_json=True):
+    """
+    Save face database as a binary store next to db_file.
+
+    With export_json, a compact JSON copy is also written to db_file for
+    tools that still read the JSON gallery. It is written before the store,
+    so the store is never older than the JSON and stays the source the
+    service loads. Any pending gallery log records are discarded, since the
+    database replaces the whole gallery.
+    """
     if not database:
         print("Error: No face data to save.")
         return False
         
     try:
-        with open(db_file, 'w') as f:
-            json.dump(database, f, indent=2)
-        print(f"\n✅ Face database saved to '{db_file}'")
+        names, embeddings, offsets = database_to_arrays(database)
+        write_snapshot(db_file, names, embeddings, offsets, export_json=export_json)
+        print(f"\n✅ Face database saved to '{store_paths(db_file)[0]}'")
         print(f"📊 Total registered faces: {len(database)}")
         return True
     except Exception as e:
@@ -167,28 +509,103 @@ def save_face_database(database, db_file="face_database.json"):
         return False
 
 
+def same_embedding(a, b):
+    """True when two stored embeddings (flat or template lists) are equal up to float32 rounding."""
+    a, b = np.asarray(a, dtype=np.float32), np.asarray(b, dtype=np.float32)
+    return a.shape == b.shape and np.allclose(a, b, rtol=0, atol=1e-6)
+
+
+def append_to_face_database(new_faces, db_file="face_database.json", existing_db=None):
+    """
+    Add or replace faces by appending them to the gallery log.
+
+    Only the new embeddings are written; the running service picks them up
+    without reloading the gallery. Identities whose embedding equals the
+    one in existing_db (e.g. a re-run served entirely from the embedding
+    cache) are skipped, so re-runs do not grow the log. The log is folded
+    into a new snapshot once it has grown large enough.
+    """
+    if not new_faces:
+        print("Error: No face data to save.")
+        return False
+
+    existing_db = existing_db or {}
+    changed = {name: embedding for name, embedding in new_faces.items()
+               if name not in existing_db or not same_embedding(embedding, existing_db[name])}
+    unchanged = len(new_faces) - len(changed)
+    if not changed:
+        print(f"\n✅ All {unchanged} faces unchanged; nothing appended")
+        return True
+
+    try:
+        append_mutations(db_file, [add_op(name, embedding) for name, embedding in changed.items()])
+        print(f"\n✅ Appended {len(changed)} faces to '{log_path_for(db_file)}' ({unchanged} unchanged)")
+        if maybe_compact(db_file):
+            print("📦 Compacted gallery log into a new snapshot")
+            # Rebuild the ANN index over the new snapshot's rows
+            build_ann_index(state_to_database(*load_state(db_file)), db_file)
+        return True
+    except Exception as e:
+        print(f"Error appending to face database: {e}")
+        return False
+
+
+def build_ann_index(database, db_file="face_database.json"):
+    """Build the ANN index next to the gallery when it is large enough to benefit."""
+    if len(database) < ANN_MIN_SIZE:
+        return False
+
+    try:
+        names, embeddings, _ = database_to_arrays(database)
+        start = time.time()
+        index = build_index_for_gallery(names, embeddings, db_file)
+        print(f"🗂️  Built ANN index with {len(index.centroids)} lists in {time.time() - start:.1f}s")
+        return True
+    except Exception as e:
+        print(f"Error building ANN index: {e}")
+        return False
+
+
 def load_existing_database(db_file="face_database.json"):
-    """Load existing face database if it exists."""
+    """Load existing face database (snapshot plus pending log records) if it exists."""
     try:
-        with open(db_file, 'r') as f:
-            database = json.load(f)
-        print(f"📂 Loaded existing database with {len(database)} faces")
+        database = state_to_database(*load_state(db_file))
+        if database:
+            print(f"📂 Loaded existing database with {len(database)} faces")
+        else:
+            print("📂 No existing database found, creating new one")
         return database
-    except FileNotFoundError:
-        print("📂 No existing database found, creating new one")
-        return {}
     except Exception as e:
         print(f"Error loading existing database: {e}")
         return {}
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Register faces from a dataset of person folders.")
+    parser.add_argument("--dataset", default="new_reg")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Enrollment processes (default 1: sequential)")
+    parser.add_argument("--threads", type=int, default=1,
+                        help="Interpreter threads per enrollment process")
+    parser.add_argument("--templates", type=int, default=0,
+                        help="Templates kept per identity (default 0: one centroid of all images)")
+    parser.add_argument("--checkpoint", default=None,
+                        help="Resumable progress file (default: <dataset>.enroll_checkpoint.jsonl)")
+    parser.add_argument("--cache", default=EMBEDDING_CACHE_PATH,
+                        help="Embedding cache keyed by image content hash ('' disables it)")
+    parser.add_argument("--force", action="store_true",
+                        help="Recompute every embedding instead of reusing cached ones")
+    args = parser.parse_args()
+
     print("=== Face Registration System (Dataset Mode) ===")
     print("This script will register all faces from the 'faces_dataset' directory")
     print()
     
     # Check if dataset directory exists
-    dataset_path = "new_reg"
+    dataset_path = args.dataset
+    checkpoint_path = args.checkpoint
+    if checkpoint_path is None:
+        checkpoint_path = str(Path(dataset_path).resolve()) + ".enroll_checkpoint.jsonl"
     if not Path(dataset_path).exists():
         print(f"❌ Error: '{dataset_path}' directory not found!")
         print("Please create the 'faces_dataset' directory and add person folders with images.")
@@ -216,7 +633,10 @@ if __name__ == "__main__":
     print()
     
     # Register faces from dataset
-    new_faces = register_faces_from_dataset(dataset_path)
+    new_faces = register_faces_from_dataset(dataset_path, workers=args.workers,
+                                            checkpoint_path=checkpoint_path, num_threads=args.threads,
+                                            max_templates=args.templates, cache_path=args.cache,
+                                            force=args.force)
     
     if new_faces:
         # Merge with existing database
@@ -224,15 +644,27 @@ if __name__ == "__main__":
         
         # Show what was updated
         if existing_db:
-            updated_faces = set(new_faces.keys()) & set(existing_db.keys())
+            updated_faces = [name for name in new_faces
+                             if name in existing_db and not same_embedding(new_faces[name], existing_db[name])]
             if updated_faces:
                 print(f"🔄 Updated existing faces: {', '.join(updated_faces)}")
         
-        # Save the database
-        if save_face_database(final_database, db_file):
+        if existing_db:
+            # Merging only appends new and changed faces to the gallery log
+            saved = append_to_face_database(new_faces, db_file, existing_db)
+        else:
+            # Build the ANN index first so the serving process never pairs
+            # the new gallery with an out-of-date index
+            build_ann_index(final_database, db_file)
+            saved = save_face_database(final_database, db_file)
+
+        if saved:
             print(f"\n🎉 Registration complete!")
             print(f"📋 Final database contains: {', '.join(final_database.keys())}")
             print("You can now use authenticate_face.py to verify identities.")
+            # The gallery now holds everything the checkpoint recorded
+            if checkpoint_path and os.path.exists(checkpoint_path):
+                os.remove(checkpoint_path)
         else:
             print("\n❌ Failed to save face database.")
     else:
@@ -0,0 +1,97 @@
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+from embedding_cache import hash_file
+from face_detector import detector_signature
+from face_model import MODEL_PATH, PREPROCESS_VERSION
+
+# Most responses kept, and seconds each one stays valid (0 disables the cache)
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "256"))
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "300"))
+
+_model_version = None
+
+
+def model_version():
+    """Identifies everything that turns pixels into an embedding: model file, preprocessing and detector."""
+    global _model_version
+    if _model_version is None:
+        try:
+            model_hash = hash_file(MODEL_PATH)[:16]
+        except OSError:
+            model_hash = MODEL_PATH
+        _model_version = f"{model_hash}/{PREPROCESS_VERSION}/{detector_signature()}"
+    return _model_version
+
+
+def result_cache_key(image_bytes, location, gallery_version, *options):
+    """Key for a response: upload content hash, location, gallery and model versions, request options."""
+    return (hashlib.sha256(image_bytes).hexdigest(), location, gallery_version, model_version()) + options
+
+
+class ResultCache:
+    """
+    Thread-safe LRU cache of finished responses with a per-entry TTL.
+
+    Entries are never invalidated explicitly: the gallery version is part
+    of the key, so a gallery change simply stops old entries from being
+    hit until they age or are evicted out.
+    """
+
+    def __init__(self, max_entries=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0 and self.ttl > 0
+
+    def get(self, key):
+        """Return the cached value for key, or None."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self._entries[key]
+                self._stats["expirations"] += 1
+                entry = None
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry[1]
+
+    def put(self, key, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def metrics(self):
+        with self._lock:
+            stats = dict(self._stats)
+            size = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats.update({
+            "size": size,
+            "max_entries": self.max_entries,
+            "ttl_s": self.ttl,
+            "hit_rate": round(stats["hits"] / lookups, 4) if lookups else 0.0,
+        })
+        return stats
@@ -0,0 +1,24 @@
+"""
+Flask request class that keeps multipart file uploads in memory.
+
+Werkzeug's default form parser spools every file part over 500 KB to a
+temporary file on disk, so a typical 12 MP photo upload would still be
+written to the filesystem before the handler reads it. File parts are
+buffered in memory instead, up to UPLOAD_MEMORY_LIMIT_MB per part; only
+larger parts (e.g. long /video uploads) roll over to a temporary file.
+
+    app.request_class = InMemoryUploadRequest
+"""
+import os
+from tempfile import SpooledTemporaryFile
+
+from flask import Request
+
+# Largest file part buffered in memory; bigger parts spill to a temp file
+UPLOAD_MEMORY_LIMIT_MB = float(os.getenv("UPLOAD_MEMORY_LIMIT_MB", "64"))
+
+
+class InMemoryUploadRequest(Request):
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        # SpooledTemporaryFile creates no file on disk until it outgrows max_size
+        return SpooledTemporaryFile(max_size=int(UPLOAD_MEMORY_LIMIT_MB * 1024 * 1024), mode="rb+")
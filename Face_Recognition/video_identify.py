@@ -0,0 +1,246 @@
+"""
+Identify faces in a video clip, embedding each tracked face once.
+
+Frames are decoded with OpenCV and sampled at FACE_VIDEO_FPS. Faces are
+detected on every sampled frame and linked across frames by a greedy IoU
+tracker; a track is embedded and matched against the gallery once, using
+the largest crop seen so far: as soon as it has been seen on
+FACE_TRACK_MIN_HITS sampled frames, or otherwise when it closes or the clip
+ends. Results are yielded as events while the clip is still being read.
+
+    python video_identify.py clip.mp4 --fps 5
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+import cv2
+
+from authenticate_face import INFERENCE_TIMEOUT, detect_faces
+from face_gallery import get_gallery
+from inference_scheduler import get_scheduler
+
+# Frames per second of video that are actually decoded and detected
+VIDEO_SAMPLE_FPS = float(os.getenv("FACE_VIDEO_FPS", "5"))
+# Least box overlap for a detection to continue a track
+TRACK_IOU = float(os.getenv("FACE_TRACK_IOU", "0.3"))
+# Sampled frames a face must be seen on before it is embedded
+TRACK_MIN_HITS = int(os.getenv("FACE_TRACK_MIN_HITS", "2"))
+# Sampled frames a track may go undetected before it is closed
+TRACK_MAX_MISSES = int(os.getenv("FACE_TRACK_MAX_MISSES", "5"))
+
+
+def iou(a, b):
+    """Intersection over union of two (x, y, w, h) boxes."""
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    iw = min(ax + aw, bx + bw) - max(ax, bx)
+    ih = min(ay + ah, by + bh) - max(ay, by)
+    if iw <= 0 or ih <= 0:
+        return 0.0
+    inter = iw * ih
+    return inter / float(aw * ah + bw * bh - inter)
+
+
+class Track:
+    __slots__ = ("track_id", "bbox", "first_frame", "last_frame", "hits", "misses", "best_crop", "best_area",
+                 "best_bbox", "best_time", "matched")
+
+    def __init__(self, track_id, bbox, frame_index, time_s, crop):
+        self.track_id = track_id
+        self.bbox = bbox
+        self.first_frame = frame_index
+        self.last_frame = frame_index
+        self.hits = 1
+        self.misses = 0
+        self.best_crop = crop
+        self.best_area = bbox[2] * bbox[3]
+        self.best_bbox = bbox
+        self.best_time = time_s
+        self.matched = False
+
+    def update(self, bbox, frame_index, time_s, frame):
+        self.bbox = bbox
+        self.last_frame = frame_index
+        self.hits += 1
+        self.misses = 0
+        # Keep the largest view until the track is embedded
+        if not self.matched and bbox[2] * bbox[3] > self.best_area:
+            self.best_crop = _crop(frame, bbox)
+            self.best_area = bbox[2] * bbox[3]
+            self.best_bbox = bbox
+            self.best_time = time_s
+
+
+class IoUTracker:
+    """
+    Greedy IoU tracker over per-frame face boxes.
+
+    update() links each detection to the open track it overlaps most (at
+    least iou_threshold), opens tracks for the rest and closes tracks
+    unseen for more than max_misses frames. It returns the tracks that still
+    need an embedding and either have reached min_hits or have just closed;
+    flush() closes and returns the rest at the end of the stream.
+    """
+
+    def __init__(self, iou_threshold=TRACK_IOU, min_hits=TRACK_MIN_HITS, max_misses=TRACK_MAX_MISSES):
+        self.iou_threshold = iou_threshold
+        self.min_hits = min_hits
+        self.max_misses = max_misses
+        self.tracks = []
+        self.next_id = 1
+        self.total_tracks = 0
+
+    def update(self, frame, boxes, frame_index, time_s):
+        pairs = sorted(
+            ((iou(track.bbox, box), t, b) for t, track in enumerate(self.tracks) for b, box in enumerate(boxes)),
+            reverse=True,
+        )
+        used_tracks, used_boxes = set(), set()
+        for overlap, t, b in pairs:
+            if overlap < self.iou_threshold:
+                break
+            if t in used_tracks or b in used_boxes:
+                continue
+            used_tracks.add(t)
+            used_boxes.add(b)
+            self.tracks[t].update(boxes[b], frame_index, time_s, frame)
+
+        for t, track in enumerate(self.tracks):
+            if t not in used_tracks:
+                track.misses += 1
+        # A face seen too briefly for min_hits is still matched once, when its track closes
+        closed = [track for track in self.tracks if track.misses > self.max_misses and not track.matched]
+        self.tracks = [track for track in self.tracks if track.misses <= self.max_misses]
+
+        for b, box in enumerate(boxes):
+            if b not in used_boxes:
+                self.tracks.append(Track(self.next_id, box, frame_index, time_s, _crop(frame, box)))
+                self.next_id += 1
+                self.total_tracks += 1
+
+        return closed + [track for track in self.tracks if not track.matched and track.hits >= self.min_hits]
+
+    def flush(self):
+        """Close every open track, returning those that were never embedded."""
+        remaining = [track for track in self.tracks if not track.matched]
+        self.tracks = []
+        return remaining
+
+
+def _crop(frame, box):
+    x, y, w, h = box
+    return frame[y:y + h, x:x + w].copy()
+
+
+def iter_sampled_frames(source, sample_fps=VIDEO_SAMPLE_FPS):
+    """
+    Yield (frame_index, time_s, frame) for frames sampled at sample_fps.
+
+    Skipped frames are only grabbed, not decoded into images.
+    """
+    capture = cv2.VideoCapture(source)
+    if not capture.isOpened():
+        raise ValueError(f"Could not open video {source}")
+    try:
+        native_fps = capture.get(cv2.CAP_PROP_FPS) or 25.0
+        step = max(1, int(round(native_fps / sample_fps))) if sample_fps > 0 else 1
+        frame_index = 0
+        while capture.grab():
+            if frame_index % step == 0:
+                ok, frame = capture.retrieve()
+                if not ok:
+                    break
+                yield frame_index, frame_index / native_fps, frame
+            frame_index += 1
+    finally:
+        capture.release()
+
+
+def _match_tracks(tracks, threshold):
+    """Embed the tracks' best crops in one batched call and match them in one matrix product."""
+    embeddings = get_scheduler().embed([track.best_crop for track in tracks], timeout=INFERENCE_TIMEOUT)
+    database = get_gallery().snapshot()
+    if len(database):
+        matches = database.matcher.match_batch(embeddings, threshold=threshold)
+    else:
+        matches = [{"name": None, "similarity": -1.0} for _ in tracks]
+
+    events = []
+    for track, match in zip(tracks, matches):
+        track.matched = True
+        track.best_crop = None
+        events.append({
+            "event": "track",
+            "track_id": track.track_id,
+            "name": match["name"],
+            "score": round(float(match["similarity"]), 4),
+            "bbox": list(track.best_bbox),
+            "frame": track.last_frame,
+            "time_s": round(track.best_time, 3),
+        })
+    return events
+
+
+def identify_video(source, sample_fps=VIDEO_SAMPLE_FPS, threshold=0.3, tracker=None):
+    """
+    Identify the faces in a video file, yielding result events as they arrive.
+
+    Yields one {"event": "track", ...} per track with its match (name is
+    None below threshold), then a final {"event": "summary", ...} with the
+    best score per identity and throughput counters.
+    """
+    tracker = tracker or IoUTracker()
+    start = time.perf_counter()
+    sampled = 0
+    embedded = 0
+    last_time = 0.0
+    best = {}
+
+    def record(events):
+        for event in events:
+            if event["name"] and event["score"] > best.get(event["name"], -1.0):
+                best[event["name"]] = event["score"]
+        return events
+
+    for frame_index, time_s, frame in iter_sampled_frames(source, sample_fps):
+        sampled += 1
+        last_time = time_s
+        ready = tracker.update(frame, detect_faces(frame), frame_index, time_s)
+        if ready:
+            embedded += len(ready)
+            yield from record(_match_tracks(ready, threshold))
+
+    # Tracks still open when the clip ends have not been matched yet
+    remaining = tracker.flush()
+    if remaining:
+        embedded += len(remaining)
+        yield from record(_match_tracks(remaining, threshold))
+
+    elapsed = time.perf_counter() - start
+    yield {
+        "event": "summary",
+        "identities": best,
+        "frames_sampled": sampled,
+        "tracks": tracker.total_tracks,
+        "embeddings": embedded,
+        "video_s": round(last_time, 3),
+        "elapsed_s": round(elapsed, 3),
+        "realtime_factor": round(last_time / elapsed, 2) if elapsed > 0 else None,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Identify faces in a video clip.")
+    parser.add_argument("video")
+    parser.add_argument("--fps", type=float, default=VIDEO_SAMPLE_FPS, help="Frames sampled per second of video")
+    parser.add_argument("--threshold", type=float, default=0.3)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.video):
+        print(f"❌ Video not found: {args.video}")
+        sys.exit(1)
+    for event in identify_video(args.video, args.fps, args.threshold):
+        print(json.dumps(event))
@@ -0,0 +1,111 @@
+"""
+Compare the header-only EXIF reader with the PIL path on per-file cost.
+
+Times the tag/dimension read of each image through PIL and through the
+header reader (which falls back to PIL for formats it does not handle), then
+checks that get_image_metadata_dict returns identical results either way.
+Without --images, a set of multi-MB camera-like JPEGs (noise, full EXIF
+and GPS block) is generated in a temporary directory.
+
+    python benchmark_extract.py --images /evidence/photos --limit 500
+    python benchmark_extract.py --generate 20 --size 4000x3000
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+import extract
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.tif', '.tiff', '.png', '.webp', '.heic'}
+
+
+def generate_images(directory, count, width, height):
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(count):
+        image = Image.fromarray(rng.integers(0, 256, (height, width, 3), dtype=np.uint8))
+        exif = Image.Exif()
+        exif[0x010F] = "Canon"
+        exif[0x0110] = "Canon EOS 80D"
+        exif[0x0132] = "2024:03:01 10:15:00"
+        exif[0x0112] = 1
+        exif.get_ifd(0x8769).update({0x9003: "2024:03:01 10:15:%02d" % (i % 60), 0x829D: 2.8, 0x8827: 400})
+        exif.get_ifd(0x8825).update({
+            1: "N", 2: (18.0, 31.0, 13.2), 3: "E", 4: (73.0, 51.0, 24.1),
+            5: b"\x00", 6: 560.5, 7: (10.0, 15.0, 0.0), 29: "2024:03:01",
+        })
+        path = os.path.join(directory, f"generated_{i:04d}.jpg")
+        image.save(path, quality=95, exif=exif)
+        paths.append(path)
+    return paths
+
+
+def read_header(path):
+    return extract.read_exif_header(path) or extract._read_exif_pil(path)
+
+
+def measure(paths, reader, repeat=1):
+    latencies = []
+    for _ in range(repeat):
+        for path in paths:
+            start = time.perf_counter()
+            reader(path)
+            latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def full_results(paths, fast_path):
+    extract.EXIF_FAST_PATH = fast_path
+    return [extract.get_image_metadata_dict(path) for path in paths]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--images", help="Directory searched recursively for images")
+    parser.add_argument("--limit", type=int, default=500)
+    parser.add_argument("--generate", type=int, default=20, help="Images to generate when --images is not given")
+    parser.add_argument("--size", default="4000x3000", help="Generated image size, WxH")
+    parser.add_argument("--repeat", type=int, default=5, help="Passes over the images per reader")
+    args = parser.parse_args()
+
+    # Geocoding is not what is measured here
+    extract.NOMINATIM_MODE = "off"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.images:
+            paths = sorted(str(p) for p in Path(args.images).rglob("*")
+                           if p.suffix.lower() in IMAGE_EXTENSIONS)[:args.limit]
+        else:
+            width, height = (int(v) for v in args.size.lower().split("x"))
+            paths = generate_images(tmp, args.generate, width, height)
+        if not paths:
+            print(f"❌ No images found under {args.images}")
+            return
+
+        megabytes = statistics.mean(os.path.getsize(p) for p in paths) / 1e6
+        print(f"{len(paths)} images, {megabytes:.1f} MB on average")
+
+        # Warm up the page cache and the PIL plugins for both paths
+        measure(paths, extract._read_exif_pil)
+        print(f"{'reader':>8} {'median ms':>10} {'mean ms':>9} {'p95 ms':>8}")
+        for label, reader in (("pil", extract._read_exif_pil), ("header", read_header)):
+            latencies = measure(paths, reader, args.repeat)
+            print(f"{label:>8} {statistics.median(latencies):>10.3f} {statistics.mean(latencies):>9.3f} "
+                  f"{np.percentile(latencies, 95):>8.3f}")
+
+        pil_results, header_results = full_results(paths, False), full_results(paths, True)
+        mismatches = [p for p, a, b in zip(paths, pil_results, header_results) if a != b]
+        print(f"Identical results: {len(paths) - len(mismatches)}/{len(paths)}")
+        for path in mismatches[:5]:
+            print(f"  differs: {path}")
+
+
+if __name__ == "__main__":
+    main()
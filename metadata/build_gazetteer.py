@@ -0,0 +1,83 @@
+"""
+Build the offline geocoder's gazetteer from GeoNames dump files.
+
+Reads a GeoNames cities table (cities1000.txt, or cities500.txt for finer
+coverage) together with admin1CodesASCII.txt and countryInfo.txt from
+https://download.geonames.org/export/dump/ and writes the gzipped CSV
+(name, admin1, country, country_code, latitude, longitude) that
+extract.OfflineGeocoder loads. GeoNames data is licensed CC BY 4.0
+(https://www.geonames.org/); the bundled data/gazetteer.csv.gz is built
+from cities1000.
+
+    python build_gazetteer.py cities500.txt admin1CodesASCII.txt countryInfo.txt --output data/gazetteer.csv.gz
+"""
+import argparse
+import csv
+import gzip
+import os
+
+# GeoNames "geoname" table columns used here
+NAME, ASCII_NAME, LATITUDE, LONGITUDE, COUNTRY_CODE, ADMIN1_CODE = 1, 2, 4, 5, 8, 10
+
+
+def read_admin1_names(path):
+    """{"CC.code": ascii name} from admin1CodesASCII.txt."""
+    names = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) >= 3:
+                names[fields[0]] = fields[2] or fields[1]
+    return names
+
+
+def read_country_names(path):
+    """{ISO code: country name} from countryInfo.txt."""
+    names = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.startswith("#"):
+                continue
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) >= 5:
+                names[fields[0]] = fields[4]
+    return names
+
+
+def build(cities_path, admin1_path, countries_path, output):
+    admin1_names = read_admin1_names(admin1_path)
+    country_names = read_country_names(countries_path)
+    count = 0
+    tmp_path = output + ".tmp"
+    with open(cities_path, encoding='utf-8') as source, \
+            gzip.open(tmp_path, 'wt', encoding='utf-8', newline='') as target:
+        writer = csv.writer(target)
+        writer.writerow(["name", "admin1", "country", "country_code", "latitude", "longitude"])
+        for line in source:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) <= ADMIN1_CODE:
+                continue
+            country_code = fields[COUNTRY_CODE]
+            writer.writerow([
+                fields[ASCII_NAME] or fields[NAME],
+                admin1_names.get(f"{country_code}.{fields[ADMIN1_CODE]}", ""),
+                country_names.get(country_code, ""),
+                country_code,
+                fields[LATITUDE],
+                fields[LONGITUDE],
+            ])
+            count += 1
+    os.replace(tmp_path, output)
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("cities", help="GeoNames cities500.txt / cities1000.txt")
+    parser.add_argument("admin1", help="GeoNames admin1CodesASCII.txt")
+    parser.add_argument("countries", help="GeoNames countryInfo.txt")
+    parser.add_argument("--output", default=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                         "data", "gazetteer.csv.gz"))
+    args = parser.parse_args()
+    count = build(args.cities, args.admin1, args.countries, args.output)
+    print(f"✅ Wrote {count} places to {args.output}")
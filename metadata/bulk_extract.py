@@ -0,0 +1,344 @@
+"""
+Bulk metadata extraction over directories and zip/tar archives.
+
+Inputs are walked lazily: directories recursively, archives (also those
+found inside directories) member by member, so nothing is listed up front.
+Plain files are sent to the worker processes by path; archive members are
+read in the parent and sent as bytes. At most workers * BULK_INFLIGHT tasks
+are in flight and at most one flush batch of results is held, so memory
+stays bounded however many files there are.
+
+Results are appended as JSON Lines, or written as Parquet part files into
+an output directory (needs pyarrow). After every flush the output is
+fsynced, then the sources just written are appended to a manifest with the
+output's new length and the manifest is fsynced. A rerun with the same
+manifest skips those sources and cuts the JSON Lines file back to the last
+recorded length, dropping the results of a flush that was interrupted
+(they are extracted again), so an interrupted sweep resumes where it
+stopped without duplicate lines. A Parquet part file written just before
+an interruption can still repeat rows of the next run.
+
+    python main.py --bulk /evidence/phone_dump /evidence/seized.zip --output triage.jsonl
+"""
+import io
+import os
+import json
+import time
+import tarfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from extract import get_image_metadata_dict
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.tif', '.tiff', '.webp', '.bmp', '.gif', '.heic', '.heif'}
+ARCHIVE_SUFFIXES = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+# Tasks queued per worker process
+BULK_INFLIGHT = int(os.getenv("METADATA_BULK_INFLIGHT", "4"))
+# Results per write (JSON Lines) / rows per part file (Parquet)
+JSONL_FLUSH_EVERY = int(os.getenv("METADATA_BULK_FLUSH_EVERY", "256"))
+PARQUET_ROWS_PER_FILE = int(os.getenv("METADATA_BULK_PARQUET_ROWS", "10000"))
+# Seconds between progress lines
+PROGRESS_EVERY_S = 10
+# Manifest line closing a flush, followed by the output length (JSON Lines)
+MANIFEST_OFFSET = "#offset\t"
+
+
+def _is_image(name):
+    return os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+
+
+def _is_archive(name):
+    return name.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+class SourceWalker:
+    """
+    Iterates (source_id, payload) over the inputs, skipping sources in done.
+
+    source_id is the file path, or "archive!member" for archive members;
+    payload is the path, or the member's bytes.
+    """
+
+    def __init__(self, inputs, done=frozenset()):
+        self.inputs = inputs
+        self.done = done
+        self.skipped = 0
+
+    def __iter__(self):
+        for input_path in self.inputs:
+            if os.path.isdir(input_path):
+                for root, dirs, files in os.walk(input_path):
+                    dirs.sort()
+                    for name in sorted(files):
+                        yield from self._file(os.path.join(root, name))
+            elif os.path.exists(input_path):
+                yield from self._file(input_path)
+            else:
+                print(f"[WARN] Input not found: {input_path}")
+
+    def _file(self, path):
+        if _is_archive(path):
+            yield from self._archive(path)
+        elif _is_image(path):
+            if path in self.done:
+                self.skipped += 1
+            else:
+                yield path, path
+
+    def _archive(self, path):
+        try:
+            if path.lower().endswith('.zip'):
+                with zipfile.ZipFile(path) as archive:
+                    for info in archive.infolist():
+                        if info.is_dir() or not _is_image(info.filename):
+                            continue
+                        source = f"{path}!{info.filename}"
+                        if source in self.done:
+                            self.skipped += 1
+                            continue
+                        yield source, archive.read(info)
+            else:
+                # Stream mode: compressed tars are read front to back once
+                with tarfile.open(path, 'r|*') as archive:
+                    for member in archive:
+                        if not member.isfile() or not _is_image(member.name):
+                            continue
+                        source = f"{path}!{member.name}"
+                        if source in self.done:
+                            self.skipped += 1
+                            continue
+                        yield source, archive.extractfile(member).read()
+        except (zipfile.BadZipFile, tarfile.TarError, OSError) as e:
+            print(f"[WARN] Could not read archive {path}: {e}")
+
+
+def extract_one(source, payload):
+    """Worker: metadata dict of one image, tagged with its source id."""
+    if isinstance(payload, str):
+        metadata = get_image_metadata_dict(payload)
+    else:
+        metadata = get_image_metadata_dict(io.BytesIO(payload))
+        if "filename" in metadata:
+            metadata["filename"] = source
+    metadata["source"] = source
+    return metadata
+
+
+class JsonlWriter:
+    """
+    Appends records to a JSON Lines file.
+
+    offset is the file length the manifest recorded at the last complete
+    flush. Anything past it was written by a flush whose sources never made
+    it into the manifest, so it is cut off before appending.
+    """
+
+    flush_every = JSONL_FLUSH_EVERY
+
+    def __init__(self, path, offset=None):
+        self.path = path
+        if offset is not None and os.path.exists(path) and os.path.getsize(path) > offset:
+            print(f"[WARN] Dropping {os.path.getsize(path) - offset} bytes of unrecorded results from {path}")
+            os.truncate(path, offset)
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def write(self, records):
+        self._file.write("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def position(self):
+        return os.fstat(self._file.fileno()).st_size
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetWriter:
+    """
+    Writes each batch as a complete part file in the output directory.
+
+    A Parquet file is unreadable until its footer is written, so rows are
+    only recorded in the manifest once their part file has been closed.
+    """
+
+    flush_every = PARQUET_ROWS_PER_FILE
+
+    def __init__(self, directory):
+        if not PYARROW_AVAILABLE:
+            raise ImportError("pyarrow is required for Parquet output (pip install pyarrow)")
+        self.path = directory
+        self.schema = pa.schema([
+            ("source", pa.string()), ("filename", pa.string()), ("format", pa.string()), ("mode", pa.string()),
+            ("width", pa.int64()), ("height", pa.int64()), ("time_taken", pa.string()),
+            ("make", pa.string()), ("model", pa.string()),
+            ("latitude", pa.float64()), ("longitude", pa.float64()), ("altitude", pa.float64()),
+            ("city", pa.string()), ("state", pa.string()), ("country", pa.string()), ("country_code", pa.string()),
+            ("error", pa.string()), ("metadata", pa.string()),
+        ])
+        self._run = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        self._parts = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def _row(record):
+        size = record.get("image_size") or {}
+        location = record.get("location") if isinstance(record.get("location"), dict) else {}
+        place = location.get("location_name") or {}
+        time_taken = record.get("time_taken")
+        return {
+            "source": record.get("source"),
+            "filename": record.get("filename"),
+            "format": record.get("format"),
+            "mode": record.get("mode"),
+            "width": size.get("width"),
+            "height": size.get("height"),
+            "time_taken": time_taken if time_taken != "No timestamp available" else None,
+            "make": str(record["Make"]) if "Make" in record else None,
+            "model": str(record["Model"]) if "Model" in record else None,
+            "latitude": location.get("latitude"),
+            "longitude": location.get("longitude"),
+            "altitude": location.get("altitude"),
+            "city": place.get("city"),
+            "state": place.get("state"),
+            "country": place.get("country"),
+            "country_code": place.get("country_code"),
+            "error": record.get("error"),
+            "metadata": json.dumps(record, ensure_ascii=False),
+        }
+
+    def write(self, records):
+        table = pa.Table.from_pylist([self._row(record) for record in records], schema=self.schema)
+        part = os.path.join(self.path, f"part-{self._run}-{self._parts:05d}.parquet")
+        with open(part + ".tmp", 'wb') as f:
+            pq.write_table(table, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(part + ".tmp", part)
+        self._parts += 1
+
+    def position(self):
+        return None
+
+    def close(self):
+        pass
+
+
+def load_manifest(path):
+    """
+    Return (sources done, output offset) as of the manifest's last complete flush.
+
+    Sources listed after the last offset line belong to a flush that was cut
+    short; they are removed from the file so those images run again. The
+    offset is None for Parquet output and for manifests written without
+    offset lines, which are taken as they are.
+    """
+    if not os.path.exists(path):
+        return set(), None
+    with open(path, 'rb') as f:
+        data = f.read()
+    done, batch, offset, end, position = set(), [], None, None, 0
+    for line in data.splitlines(keepends=True):
+        position += len(line)
+        text = line.decode('utf-8', errors='replace').rstrip("\r\n")
+        if text.startswith(MANIFEST_OFFSET) and line.endswith(b"\n"):
+            value = text[len(MANIFEST_OFFSET):]
+            offset = int(value) if value else None
+            done.update(batch)
+            batch = []
+            end = position
+        elif text.strip():
+            batch.append(text)
+    if end is None:
+        return done | set(batch), None
+    if end < len(data):
+        print(f"[WARN] Discarding {len(batch)} sources of an interrupted flush from {path}")
+        os.truncate(path, end)
+    return done, offset
+
+
+def _manifest_offset_line(position):
+    return f"{MANIFEST_OFFSET}{'' if position is None else position}\n"
+
+
+def run_bulk(inputs, output, output_format=None, workers=None, manifest_path=None):
+    """Extract metadata for every image under inputs into output. Returns the run counters."""
+    output_format = output_format or ("parquet" if output.lower().endswith(".parquet") else "jsonl")
+    workers = workers or os.cpu_count() or 1
+    manifest_path = manifest_path or output.rstrip("/\\") + ".manifest"
+
+    done, offset = load_manifest(manifest_path)
+    writer = ParquetWriter(output) if output_format == "parquet" else JsonlWriter(output, offset)
+    if done:
+        print(f"Resuming: {len(done)} files already in {manifest_path}")
+    walker = SourceWalker(inputs, done)
+    stats = {"processed": 0, "errors": 0}
+    buffer = []
+    start = time.perf_counter()
+    last_report = start
+
+    with open(manifest_path, 'a', encoding='utf-8') as manifest, \
+            ProcessPoolExecutor(max_workers=workers) as pool:
+
+        def commit(sources):
+            # The output is already on disk; the offset line marks these sources complete
+            manifest.write("".join(source + "\n" for source in sources) + _manifest_offset_line(writer.position()))
+            manifest.flush()
+            os.fsync(manifest.fileno())
+
+        def flush():
+            if buffer:
+                writer.write(buffer)
+                commit(record["source"] for record in buffer)
+                buffer.clear()
+
+        if manifest.tell() == 0:
+            # Record where this sweep's output starts
+            commit(())
+
+        def collect(finished):
+            nonlocal last_report
+            for future in finished:
+                source = pending.pop(future)
+                try:
+                    record = future.result()
+                except Exception as e:
+                    record = {"source": source, "error": f"Error processing image: {e}"}
+                stats["processed"] += 1
+                stats["errors"] += "error" in record
+                buffer.append(record)
+                if len(buffer) >= writer.flush_every:
+                    flush()
+            now = time.perf_counter()
+            if now - last_report >= PROGRESS_EVERY_S:
+                last_report = now
+                print(f"{stats['processed']} files, {stats['processed'] / (now - start):.1f} files/s")
+
+        pending = {}
+        for source, payload in walker:
+            pending[pool.submit(extract_one, source, payload)] = source
+            if len(pending) >= workers * BULK_INFLIGHT:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(finished)
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            collect(finished)
+        flush()
+    writer.close()
+
+    elapsed = time.perf_counter() - start
+    stats.update({
+        "skipped": walker.skipped,
+        "elapsed_s": round(elapsed, 2),
+        "files_per_s": round(stats["processed"] / elapsed, 1) if elapsed > 0 else None,
+    })
+    print(f"Done: {stats['processed']} files ({stats['errors']} errors, {stats['skipped']} already done) "
+          f"in {stats['elapsed_s']}s, {stats['files_per_s']} files/s -> {output}")
+    return stats
@@ -0,0 +1,244 @@
+"""
+Header-only EXIF reader for JPEG and TIFF files.
+
+The file is memory-mapped (or an in-memory buffer is viewed) and only the
+bytes that are needed are touched: for a JPEG the marker headers up to the
+first frame header plus the APP1/Exif segment, for a TIFF the IFDs. Only
+the whitelisted tags below are decoded, so a multi-MB photo costs a few KB
+of reads and no pixel or PIL plugin work. Anything else returns None and
+the caller falls back to PIL.
+"""
+import io
+import os
+import mmap
+import struct
+
+# Tags read from IFD0 (TIFF image tags are only used for TIFF files)
+IFD0_TAGS = {
+    0x010F: 'Make', 0x0110: 'Model', 0x0131: 'Software', 0x0112: 'Orientation',
+    0x011A: 'XResolution', 0x011B: 'YResolution', 0x0128: 'ResolutionUnit', 0x0132: 'DateTime',
+}
+TIFF_IMAGE_TAGS = {
+    0x0100: 'ImageWidth', 0x0101: 'ImageLength', 0x0102: 'BitsPerSample',
+    0x0106: 'PhotometricInterpretation', 0x0115: 'SamplesPerPixel',
+}
+EXIF_TAGS = {
+    0x9003: 'DateTimeOriginal', 0x9004: 'DateTimeDigitized', 0x9209: 'Flash', 0x920A: 'FocalLength',
+    0x829A: 'ExposureTime', 0x829D: 'FNumber', 0x8827: 'ISOSpeedRatings', 0xA434: 'LensModel',
+    0xA403: 'WhiteBalance', 0xA402: 'ExposureMode', 0x8822: 'ExposureProgram', 0x9207: 'MeteringMode',
+    0x9208: 'LightSource', 0xA001: 'ColorSpace', 0xA002: 'ExifImageWidth', 0xA003: 'ExifImageHeight',
+}
+GPS_TAGS = {
+    0x01: 'GPSLatitudeRef', 0x02: 'GPSLatitude', 0x03: 'GPSLongitudeRef', 0x04: 'GPSLongitude',
+    0x05: 'GPSAltitudeRef', 0x06: 'GPSAltitude', 0x07: 'GPSTimeStamp', 0x1D: 'GPSDateStamp',
+}
+EXIF_IFD_POINTER = 0x8769
+GPS_IFD_POINTER = 0x8825
+
+# Start-of-frame markers (baseline, progressive, lossless, arithmetic); not DHT/JPG/DAC
+SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+JPEG_MODES = {1: 'L', 3: 'RGB', 4: 'CMYK'}
+# (PhotometricInterpretation, SamplesPerPixel, BitsPerSample) -> PIL mode
+TIFF_MODES = {
+    (0, 1, 1): '1', (1, 1, 1): '1', (0, 1, 8): 'L', (1, 1, 8): 'L',
+    (2, 3, 8): 'RGB', (2, 4, 8): 'RGBA', (5, 4, 8): 'CMYK',
+}
+
+# TIFF field type -> (struct code, size in bytes); ASCII/UNDEFINED/RATIONAL handled separately
+_TYPES = {
+    1: ('B', 1), 2: ('s', 1), 3: ('H', 2), 4: ('L', 4), 5: ('L', 8), 6: ('b', 1), 7: ('s', 1),
+    8: ('h', 2), 9: ('l', 4), 10: ('l', 8), 11: ('f', 4), 12: ('d', 8), 13: ('L', 4),
+}
+
+
+def _rational(numerator, denominator):
+    if denominator == 0:
+        return None
+    if numerator % denominator == 0:
+        return numerator // denominator
+    return numerator / denominator
+
+
+class _TiffReader:
+    """Reads selected entries of the IFDs of a TIFF structure starting at base in data."""
+
+    def __init__(self, data, base):
+        order = bytes(data[base:base + 2])
+        if order == b'II':
+            self.endian = '<'
+        elif order == b'MM':
+            self.endian = '>'
+        else:
+            raise ValueError("Not a TIFF header")
+        if struct.unpack_from(self.endian + 'H', data, base + 2)[0] != 42:
+            raise ValueError("Not a TIFF header")
+        self.data = data
+        self.base = base
+        self.first_ifd = struct.unpack_from(self.endian + 'L', data, base + 4)[0]
+
+    def read_ifd(self, offset, wanted):
+        """Return {tag_id: value} for the wanted tags of the IFD at offset (relative to base)."""
+        data, e = self.data, self.endian
+        start = self.base + offset
+        if offset <= 0 or start + 2 > len(data):
+            return {}
+        values = {}
+        count = struct.unpack_from(e + 'H', data, start)[0]
+        for i in range(count):
+            entry = start + 2 + 12 * i
+            if entry + 12 > len(data):
+                break
+            tag, field_type, n = struct.unpack_from(e + 'HHL', data, entry)
+            if tag not in wanted or field_type not in _TYPES:
+                continue
+            code, size = _TYPES[field_type]
+            total = size * n
+            if total <= 4:
+                at = entry + 8
+            else:
+                at = self.base + struct.unpack_from(e + 'L', data, entry + 8)[0]
+            if n == 0 or at + total > len(data):
+                continue
+            values[tag] = self._value(field_type, code, n, at)
+        return values
+
+    def _value(self, field_type, code, n, at):
+        raw = self.data
+        if field_type == 2:
+            value = bytes(raw[at:at + n])
+            if value.endswith(b'\0'):
+                value = value[:-1]
+            return value.decode('latin-1', 'replace')
+        if field_type in (1, 7):
+            return bytes(raw[at:at + n])
+        if field_type in (5, 10):
+            parts = struct.unpack_from(f"{self.endian}{2 * n}{code}", raw, at)
+            values = tuple(_rational(parts[i], parts[i + 1]) for i in range(0, 2 * n, 2))
+        else:
+            values = struct.unpack_from(f"{self.endian}{n}{code}", raw, at)
+        return values[0] if n == 1 else values
+
+    def pointer(self, values, tag):
+        value = values.pop(tag, None)
+        return value if isinstance(value, int) else 0
+
+
+def _read_exif(reader, ifd0_extra=None):
+    """Collect whitelisted tags and the GPS IFD. Returns (has_exif, tags, gps_info, ifd0)."""
+    wanted = dict(IFD0_TAGS)
+    wanted.update(ifd0_extra or {})
+    ifd0 = reader.read_ifd(reader.first_ifd, set(wanted) | {EXIF_IFD_POINTER, GPS_IFD_POINTER})
+    exif_offset = reader.pointer(ifd0, EXIF_IFD_POINTER)
+    gps_offset = reader.pointer(ifd0, GPS_IFD_POINTER)
+
+    tags = {IFD0_TAGS[tag]: value for tag, value in ifd0.items() if tag in IFD0_TAGS}
+    if exif_offset:
+        tags.update((EXIF_TAGS[tag], value) for tag, value in reader.read_ifd(exif_offset, EXIF_TAGS).items())
+    gps_info = {}
+    if gps_offset:
+        gps_info = {GPS_TAGS[tag]: value for tag, value in reader.read_ifd(gps_offset, GPS_TAGS).items()}
+
+    data, base = reader.data, reader.base
+    has_exif = base + reader.first_ifd + 2 <= len(data) and \
+        struct.unpack_from(reader.endian + 'H', data, base + reader.first_ifd)[0] > 0
+    return has_exif, tags, gps_info, ifd0
+
+
+def _jpeg_header(data):
+    exif_start = None
+    frame = None
+    pos = 2
+    end = len(data)
+    while pos + 4 <= end and (exif_start is None or frame is None):
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            pos += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            pos += 2
+            continue
+        if marker in (0xD9, 0xDA):
+            break
+        length = (data[pos + 2] << 8) | data[pos + 3]
+        segment = pos + 4
+        if marker == 0xE1 and exif_start is None and bytes(data[segment:segment + 6]) == b'Exif\0\0':
+            exif_start = segment + 6
+        elif marker in SOF_MARKERS and segment + 6 <= end:
+            _, height, width, components = struct.unpack_from('>BHHB', data, segment)
+            frame = (width, height, components)
+        pos += 2 + length
+
+    if frame is None or frame[2] not in JPEG_MODES:
+        return None
+    header = {"format": "JPEG", "mode": JPEG_MODES[frame[2]], "width": frame[0], "height": frame[1],
+              "has_exif": False, "tags": {}, "gps": {}}
+    if exif_start is not None:
+        try:
+            has_exif, tags, gps_info, _ = _read_exif(_TiffReader(data, exif_start))
+        except (ValueError, struct.error):
+            return None
+        header.update({"has_exif": has_exif, "tags": tags, "gps": gps_info})
+    return header
+
+
+def _tiff_header(data):
+    try:
+        has_exif, tags, gps_info, ifd0 = _read_exif(_TiffReader(data, 0), TIFF_IMAGE_TAGS)
+    except (ValueError, struct.error):
+        return None
+    bits = ifd0.get(0x0102, 1)
+    if isinstance(bits, tuple):
+        if len(set(bits)) != 1:
+            return None
+        bits = bits[0]
+    mode = TIFF_MODES.get((ifd0.get(0x0106), ifd0.get(0x0115, 1), bits))
+    if mode is None or not isinstance(ifd0.get(0x0100), int) or not isinstance(ifd0.get(0x0101), int):
+        return None
+    return {"format": "TIFF", "mode": mode, "width": ifd0[0x0100], "height": ifd0[0x0101],
+            "has_exif": has_exif, "tags": tags, "gps": gps_info}
+
+
+def _map_input(image_input):
+    """Zero-copy view of a path, an in-memory stream or a file handle, or None if not possible."""
+    if isinstance(image_input, (str, os.PathLike)):
+        with open(image_input, 'rb') as f:
+            try:
+                return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # empty file
+                return None
+    try:
+        if image_input.tell() != 0:
+            return None
+        if hasattr(image_input, 'getbuffer'):
+            return image_input.getbuffer()
+        return mmap.mmap(image_input.fileno(), 0, access=mmap.ACCESS_READ)
+    except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+        return None
+
+
+def read_exif_header(image_input):
+    """
+    Read dimensions, mode and whitelisted EXIF/GPS tags without decoding the image.
+
+    Accepts a path or a binary file-like object (left at its position).
+    Returns {"format", "mode", "width", "height", "has_exif", "tags", "gps"}
+    with tags keyed by their EXIF names and rationals as int/float, or None
+    when the file is not a JPEG/TIFF this reader can handle.
+    """
+    view = _map_input(image_input)
+    if view is None:
+        return None
+    try:
+        magic = bytes(view[:4])
+        if magic[:2] == b'\xff\xd8':
+            return _jpeg_header(view)
+        if magic in (b'II*\0', b'MM\0*'):
+            return _tiff_header(view)
+        return None
+    finally:
+        if isinstance(view, memoryview):
+            view.release()
+        else:
+            view.close()
@@ -1,9 +1,18 @@
+import os
+import csv
+import gzip
 import json
+import math
+import heapq
+import threading
 from PIL import Image
 from PIL.ExifTags import TAGS, GPSTAGS
 from datetime import datetime
 
-# For reverse geocoding (getting city from coordinates)
+from exif_header import EXIF_IFD_POINTER, read_exif_header
+from geocode_cache import get_geocode_cache
+
+# Optional online geocoding, used where the offline gazetteer falls short
 try:
     from geopy.geocoders import Nominatim
     from geopy.exc import GeocoderTimedOut, GeocoderServiceError
@@ -11,6 +20,41 @@ try:
 except ImportError:
     GEOPY_AVAILABLE = False
 
+# Bundled gazetteer used for offline reverse geocoding: the GeoNames
+# cities1000 places (see build_gazetteer.py to rebuild it, e.g. from the
+# finer cities500). Any CSV (optionally gzipped) with the columns name,
+# admin1, country, country_code, latitude, longitude works.
+GAZETTEER_PATH = os.getenv("GEOCODER_GAZETTEER",
+                           os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "gazetteer.csv.gz"))
+# Side of a grid cell of the place index, in degrees
+GEOCODER_CELL_DEG = float(os.getenv("GEOCODER_CELL_DEG", "0.5"))
+# Distance from the nearest place up to which it is reported as the city,
+# and up to which its state / its country are reported; farther than the
+# country limit nothing is (open sea, uninhabited land)
+GEOCODER_MAX_CITY_KM = float(os.getenv("GEOCODER_MAX_CITY_KM", "25"))
+GEOCODER_MAX_REGION_KM = float(os.getenv("GEOCODER_MAX_REGION_KM", "150"))
+GEOCODER_MAX_COUNTRY_KM = float(os.getenv("GEOCODER_MAX_COUNTRY_KM", "500"))
+# State and country are reported only when the nearest place's value holds
+# this share of the inverse-square-distance weight of the nearest places
+GEOCODER_VOTE_PLACES = int(os.getenv("GEOCODER_VOTE_PLACES", "8"))
+GEOCODER_VOTE_SHARE = float(os.getenv("GEOCODER_VOTE_SHARE", "0.7"))
+# When to ask Nominatim (network, rate-limited, needs geopy): "fallback"
+# when the offline result lacks city, state or country, "always" for
+# street-level detail on every lookup, "off" never
+NOMINATIM_MODE = os.getenv("GEOCODER_NOMINATIM", "fallback").lower()
+if NOMINATIM_MODE in ("0", "false", "no"):
+    NOMINATIM_MODE = "off"
+elif NOMINATIM_MODE in ("1", "true", "yes"):
+    NOMINATIM_MODE = "always"
+NOMINATIM_TIMEOUT = float(os.getenv("GEOCODER_NOMINATIM_TIMEOUT", "10"))
+
+# Read JPEG/TIFF headers directly instead of through PIL (0 forces PIL)
+EXIF_FAST_PATH = os.getenv("METADATA_EXIF_FAST_PATH", "1").lower() not in ("0", "false", "no")
+
+EARTH_RADIUS_KM = 6371.0088
+# Grid rows with at most this many occupied cells are scanned whole
+SPARSE_ROW_CELLS = 16
+
 def _safe_float_conversion(value):
     """Safely convert a value to float, handling IFDRational and edge cases."""
     try:
@@ -62,17 +106,198 @@ def _get_decimal_coordinates(gps_info):
     
     return lat, lon
 
-def _get_location_name(latitude, longitude, timeout=10):
-    """Get location name from GPS coordinates using reverse geocoding."""
-    if not GEOPY_AVAILABLE:
-        return None
-    
+def _haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points in kilometres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+class OfflineGeocoder:
+    """
+    Nearest-place reverse geocoder over a gazetteer, with no network access.
+
+    Places are bucketed into a grid of cell_deg x cell_deg cells (longitude
+    wraps at the antimeridian). A lookup scans latitude bands outward from
+    the query point and, within a band, columns outward, skipping whatever
+    a great-circle lower bound puts farther away than the k-th best place
+    found so far, so it touches only a handful of cells at any latitude
+    (including next to the poles) regardless of gazetteer size.
+    """
+
+    def __init__(self, places, cell_deg=GEOCODER_CELL_DEG):
+        self.places = places
+        self.cell_deg = cell_deg
+        self.rows = max(1, int(math.ceil(180.0 / cell_deg)))
+        self.columns = max(1, int(round(360.0 / cell_deg)))
+        # row -> column -> place indices
+        self.grid = {}
+        for index, place in enumerate(places):
+            row, column = self._cell(place[4], place[5])
+            self.grid.setdefault(row, {}).setdefault(column, []).append(index)
+
+    @classmethod
+    def from_csv(cls, path=GAZETTEER_PATH, cell_deg=GEOCODER_CELL_DEG):
+        places = []
+        # Admin and country names repeat on every row; keep one copy of each
+        names = {}
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rt', newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                try:
+                    admin1, country = row.get('admin1') or None, row.get('country') or None
+                    country_code = (row.get('country_code') or '').upper() or None
+                    places.append((row['name'], names.setdefault(admin1, admin1), names.setdefault(country, country),
+                                   names.setdefault(country_code, country_code),
+                                   float(row['latitude']), float(row['longitude'])))
+                except (KeyError, ValueError):
+                    continue
+        return cls(places, cell_deg)
+
+    def __len__(self):
+        return len(self.places)
+
+    def _cell(self, latitude, longitude):
+        row = min(self.rows - 1, int(math.floor((latitude + 90.0) / self.cell_deg)))
+        column = int(math.floor((longitude + 180.0) / self.cell_deg)) % self.columns
+        return row, column
+
+    def nearest_k(self, latitude, longitude, k=1, max_km=float('inf')):
+        """Return up to k (place, distance_km) pairs within max_km, nearest first."""
+        if not self.places or k <= 0:
+            return []
+        row0, column0 = self._cell(latitude, longitude)
+        cos_query = math.cos(math.radians(latitude))
+        half_turn = self.columns // 2
+        best = []  # max-heap of (-distance, index)
+
+        def bound_km():
+            return min(max_km, -best[0][0]) if len(best) == k else max_km
+
+        def consider(indices):
+            for index in indices:
+                place = self.places[index]
+                distance = _haversine_km(latitude, longitude, place[4], place[5])
+                if distance > max_km:
+                    continue
+                if len(best) < k:
+                    heapq.heappush(best, (-distance, index))
+                elif distance < -best[0][0]:
+                    heapq.heapreplace(best, (-distance, index))
+
+        for dr in range(self.rows):
+            scanned = False
+            for row in {row0 - dr, row0 + dr}:
+                if not 0 <= row < self.rows:
+                    continue
+                low = row * self.cell_deg - 90.0
+                high = min(90.0, low + self.cell_deg)
+                # hav(d) >= hav(dlat) + cos(lat1) cos(lat2) hav(dlon); the band's
+                # most poleward edge gives the smallest cos(lat2)
+                lat_gap = math.radians(max(0.0, low - latitude, latitude - high))
+                hav_lat = math.sin(lat_gap / 2) ** 2
+                if 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(hav_lat))) > bound_km():
+                    continue
+                scanned = True
+                cells = self.grid.get(row)
+                if not cells:
+                    continue
+                if len(cells) <= SPARSE_ROW_CELLS:
+                    # Few occupied cells (polar and ocean bands): check them all
+                    for indices in cells.values():
+                        consider(indices)
+                    continue
+                cos_product = max(0.0, cos_query * math.cos(math.radians(max(abs(low), abs(high)))))
+                for dc in range(half_turn + 1):
+                    if dc > 1:
+                        lon_gap = math.radians((dc - 1) * self.cell_deg)
+                        hav = hav_lat + cos_product * math.sin(lon_gap / 2) ** 2
+                        if 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(hav))) > bound_km():
+                            break
+                    for column in {(column0 + dc) % self.columns, (column0 - dc) % self.columns}:
+                        consider(cells.get(column, ()))
+            # Bands only get farther from here on, and the bound only shrinks
+            if not scanned:
+                break
+        return [(self.places[index], -neg) for neg, index in sorted(best, reverse=True)]
+
+    def nearest(self, latitude, longitude, max_km=float('inf')):
+        """Return (place, distance_km) for the closest place within max_km, or (None, None)."""
+        found = self.nearest_k(latitude, longitude, 1, max_km)
+        return found[0] if found else (None, None)
+
+    def reverse(self, latitude, longitude, max_city_km=GEOCODER_MAX_CITY_KM, max_region_km=GEOCODER_MAX_REGION_KM,
+                max_country_km=GEOCODER_MAX_COUNTRY_KM, vote_places=GEOCODER_VOTE_PLACES,
+                vote_share=GEOCODER_VOTE_SHARE):
+        """
+        Approximate location from the gazetteer places around the point.
+
+        This is a nearest-place guess, not a boundary lookup, so the result
+        is marked approximate and carries no formatted_address. The nearest
+        place names the city within max_city_km. Its state (within
+        max_region_km) and country (within max_country_km) are reported
+        only when they carry at least vote_share of the inverse-square-distance
+        weight of the vote_places nearest places; otherwise the point may
+        lie on either side of a border and the field is left out.
+        """
+        neighbours = self.nearest_k(latitude, longitude, vote_places, max_km=max_country_km)
+        if not neighbours:
+            return None
+        place, distance = neighbours[0]
+        name, state, country, country_code = place[:4]
+        weights = [1.0 / max(d, 1.0) ** 2 for _, d in neighbours]
+        total = sum(weights)
+
+        def share(matches):
+            return sum(w for (other, _), w in zip(neighbours, weights) if matches(other)) / total
+
+        if share(lambda other: other[3] == country_code) < vote_share:
+            state = country = country_code = None
+        elif distance > max_region_km or share(lambda other: other[3] == country_code
+                                               and other[1] == state) < vote_share:
+            state = None
+
+        location_info = {
+            "city": name if distance <= max_city_km else None,
+            "state": state,
+            "country": country,
+            "country_code": country_code,
+            "nearest_place": name,
+            "distance_km": round(distance, 2),
+            "approximate": True,
+            "source": "offline"
+        }
+        return {k: v for k, v in location_info.items() if v is not None}
+
+_geocoder = None
+_geocoder_lock = threading.Lock()
+
+def get_geocoder():
+    """Return the process-wide offline geocoder, loading the gazetteer on first use."""
+    global _geocoder
+    if _geocoder is None:
+        with _geocoder_lock:
+            if _geocoder is None:
+                try:
+                    _geocoder = OfflineGeocoder.from_csv(GAZETTEER_PATH)
+                except OSError as e:
+                    print(f"[WARN] Gazetteer not available ({GAZETTEER_PATH}): {e}")
+                    _geocoder = OfflineGeocoder([])
+    return _geocoder
+
+_geolocator = None
+
+def _nominatim_location(latitude, longitude, timeout=NOMINATIM_TIMEOUT):
+    """Street-level reverse geocoding through Nominatim (network)."""
+    global _geolocator
     try:
-        geolocator = Nominatim(user_agent="image_metadata_extractor_v1.0")
-        location = geolocator.reverse(f"{latitude}, {longitude}", 
-                                     exactly_one=True, 
-                                     timeout=timeout,
-                                     language='en')
+        if _geolocator is None:
+            _geolocator = Nominatim(user_agent="image_metadata_extractor_v1.0")
+        location = _geolocator.reverse(f"{latitude}, {longitude}",
+                                       exactly_one=True,
+                                       timeout=timeout,
+                                       language='en')
         
         if location and location.raw:
             address = location.raw.get('address', {})
@@ -99,6 +324,49 @@ def _get_location_name(latitude, longitude, timeout=10):
     except:
         return None
 
+def _resolve_location(latitude, longitude, timeout):
+    """Return (location_info, complete); complete is False when a needed Nominatim lookup failed."""
+    try:
+        location_info = get_geocoder().reverse(latitude, longitude)
+    except Exception:
+        location_info = None
+    
+    incomplete = location_info is None or not all(location_info.get(k) for k in ("city", "state", "country"))
+    if GEOPY_AVAILABLE and (NOMINATIM_MODE == "always" or (NOMINATIM_MODE == "fallback" and incomplete)):
+        enriched = _nominatim_location(latitude, longitude, timeout=timeout)
+        if not enriched:
+            return location_info, False
+        location_info = {**enriched, "approximate": False, "source": "nominatim"}
+    
+    return location_info, True
+
+def _get_location_name(latitude, longitude, timeout=NOMINATIM_TIMEOUT):
+    """
+    Get location name from GPS coordinates.
+
+    An approximate city/state/country comes from the bundled gazetteer
+    without any network call. When that leaves city, state or country
+    unknown (GEOCODER_NOMINATIM=fallback, the default), or on every lookup
+    (=always), Nominatim is queried too if geopy is installed and, when it
+    answers, its address replaces the approximate one.
+
+    The final result is kept in the shared geocode cache, keyed on the
+    rounded coordinates and the Nominatim mode. When Nominatim was needed
+    but failed, the offline result is cached only for the negative TTL so
+    the lookup is retried later.
+    """
+    cache = get_geocode_cache()
+    tier = f"resolved-{NOMINATIM_MODE if GEOPY_AVAILABLE else 'off'}"
+    if cache is not None:
+        found, location_info = cache.get(tier, latitude, longitude)
+        if found:
+            return location_info
+    
+    location_info, complete = _resolve_location(latitude, longitude, timeout)
+    if cache is not None:
+        cache.put(tier, latitude, longitude, location_info, ttl=None if complete else cache.negative_ttl)
+    return location_info
+
 def _format_exif_value(value):
     """Format EXIF values to be JSON serializable."""
     try:
@@ -129,16 +397,49 @@ def _format_exif_value(value):
     except:
         return str(value)
 
-def get_image_metadata(image_input):
+def _read_exif_pil(image_input):
+    """Same result as read_exif_header, through PIL, for any format PIL can open."""
+    image = Image.open(image_input)
+    exif_data = image.getexif()
+    tags = {}
+    gps_info = {}
+    try:
+        ifds = [exif_data, exif_data.get_ifd(EXIF_IFD_POINTER)]
+    except:
+        ifds = [exif_data]
+    for ifd in ifds:
+        for tag_id, value in ifd.items():
+            tag_name = TAGS.get(tag_id, tag_id)
+            if tag_name == 'GPSInfo':
+                try:
+                    gps_data = exif_data.get_ifd(tag_id)
+                    for gps_tag_id in gps_data:
+                        gps_tag_name = GPSTAGS.get(gps_tag_id, gps_tag_id)
+                        gps_info[gps_tag_name] = gps_data[gps_tag_id]
+                except:
+                    pass
+            else:
+                tags[tag_name] = value
+    return {
+        "format": image.format,
+        "mode": image.mode,
+        "width": image.width,
+        "height": image.height,
+        "has_exif": bool(exif_data),
+        "tags": tags,
+        "gps": gps_info
+    }
+
+def get_image_metadata_dict(image_input):
     """
     Extract metadata from an image including location and time taken.
-    Returns the metadata as a JSON string.
+    Returns the metadata as a dict (an {"error": ...} dict on failure).
     
     Args:
         image_input (str or file-like object): Path to the image file or file handle
     
     Returns:
-        str: JSON string containing image metadata with the following structure:
+        dict: Image metadata with the following structure:
             - filename: Name of the image file or file handle info
             - image_size: Dictionary with width and height
             - format: Image format (JPEG, PNG, etc.)
@@ -148,22 +449,14 @@ def get_image_metadata(image_input):
             - Make, Model, ISO, etc.: Camera and photo settings (if available)
     
     Example:
-        >>> from extract import get_image_metadata
-        >>> # With file path
-        >>> json_data = get_image_metadata("photo.jpg")
-        >>> 
-        >>> # With file handle
-        >>> with open("photo.jpg", "rb") as f:
-        ...     json_data = get_image_metadata(f)
-        >>> 
-        >>> # Parse JSON if needed
-        >>> import json
-        >>> metadata = json.loads(json_data)
-        >>> print(metadata['location']['city'])
+        >>> from extract import get_image_metadata_dict
+        >>> metadata = get_image_metadata_dict("photo.jpg")
+        >>> print(metadata['location']['location_name']['city'])
     """
     try:
-        image = Image.open(image_input)
-        exif_data = image.getexif()
+        header = read_exif_header(image_input) if EXIF_FAST_PATH else None
+        if header is None:
+            header = _read_exif_pil(image_input)
         
         # Get filename from input
         if hasattr(image_input, 'name'):
@@ -176,24 +469,22 @@ def get_image_metadata(image_input):
         metadata = {
             "filename": filename,
             "image_size": {
-                "width": image.width,
-                "height": image.height
+                "width": header["width"],
+                "height": header["height"]
             },
-            "format": image.format,
-            "mode": image.mode
+            "format": header["format"],
+            "mode": header["mode"]
         }
         
-        if not exif_data:
+        if not header["has_exif"]:
             metadata["warning"] = "No EXIF data found in the image"
             metadata["location"] = "No GPS data available"
             metadata["time_taken"] = "No timestamp available"
-            return json.dumps(metadata, indent=2, ensure_ascii=False)
+            return metadata
         
-        gps_info = {}
-        for tag_id, value in exif_data.items():
+        gps_info = header["gps"]
+        for tag_name, value in header["tags"].items():
             try:
-                tag_name = TAGS.get(tag_id, tag_id)
-                
                 if tag_name in ['DateTime', 'DateTimeOriginal', 'DateTimeDigitized']:
                     try:
                         dt = datetime.strptime(str(value), '%Y:%m:%d %H:%M:%S')
@@ -201,15 +492,6 @@ def get_image_metadata(image_input):
                     except:
                         metadata[tag_name] = str(value)
                 
-                elif tag_name == 'GPSInfo':
-                    try:
-                        gps_data = exif_data.get_ifd(tag_id)
-                        for gps_tag_id in gps_data:
-                            gps_tag_name = GPSTAGS.get(gps_tag_id, gps_tag_id)
-                            gps_info[gps_tag_name] = gps_data[gps_tag_id]
-                    except:
-                        pass
-                
                 elif tag_name in ['Make', 'Model', 'Software', 'Orientation', 
                                   'XResolution', 'YResolution', 'ResolutionUnit',
                                   'Flash', 'FocalLength', 'ExposureTime', 'FNumber',
@@ -237,6 +519,8 @@ def get_image_metadata(image_input):
                         altitude = _safe_float_conversion(gps_info['GPSAltitude'])
                         if altitude is not None:
                             altitude_ref = gps_info.get('GPSAltitudeRef', 0)
+                            if isinstance(altitude_ref, bytes):
+                                altitude_ref = altitude_ref[0] if altitude_ref else 0
                             if altitude_ref == 1:
                                 altitude = -altitude
                             metadata['location']['altitude'] = round(altitude, 2)
@@ -252,10 +536,9 @@ def get_image_metadata(image_input):
                         except:
                             pass
                     
-                    if GEOPY_AVAILABLE:
-                        location_info = _get_location_name(lat, lon)
-                        if location_info:
-                            metadata['location']['location_name'] = location_info
+                    location_info = _get_location_name(lat, lon)
+                    if location_info:
+                        metadata['location']['location_name'] = location_info
                     
                 else:
                     metadata['location'] = "GPS coordinates could not be parsed"
@@ -270,12 +553,48 @@ def get_image_metadata(image_input):
         
         metadata['time_taken'] = time_taken if time_taken else "No timestamp available"
         
-        return json.dumps(metadata, indent=2, ensure_ascii=False)
+        return metadata
         
     except FileNotFoundError:
         filename = image_input if isinstance(image_input, str) else getattr(image_input, 'name', 'file_handle')
-        error_data = {"error": f"File not found: {filename}"}
-        return json.dumps(error_data, indent=2, ensure_ascii=False)
+        return {"error": f"File not found: {filename}"}
     except Exception as e:
-        error_data = {"error": f"Error processing image: {str(e)}"}
-        return json.dumps(error_data, indent=2, ensure_ascii=False)
\ No newline at end of file
+        return {"error": f"Error processing image: {str(e)}"}
+
+class LazyMetadata:
+    """
+    Metadata dict whose JSON text is only built when first asked for.
+
+    str() (and so logging's %s formatting, which only happens for records
+    that are actually emitted) returns the same indented JSON as
+    get_image_metadata, computed once.
+    """
+
+    __slots__ = ("data", "_text")
+
+    def __init__(self, data):
+        self.data = data
+        self._text = None
+
+    def __str__(self):
+        if self._text is None:
+            self._text = json.dumps(self.data, indent=2, ensure_ascii=False)
+        return self._text
+
+def get_image_metadata_lazy(image_input):
+    """Like get_image_metadata_dict, wrapped in a LazyMetadata for callers that may need the JSON text."""
+    return LazyMetadata(get_image_metadata_dict(image_input))
+
+def get_image_metadata(image_input):
+    """
+    Extract metadata from an image as a JSON string.
+
+    Thin wrapper around get_image_metadata_dict, kept for callers that want
+    text; in-process callers should use the dict API.
+
+    Example:
+        >>> from extract import get_image_metadata
+        >>> with open("photo.jpg", "rb") as f:
+        ...     json_data = get_image_metadata(f)
+    """
+    return str(get_image_metadata_lazy(image_input))
\ No newline at end of file
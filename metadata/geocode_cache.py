@@ -0,0 +1,179 @@
+"""
+Persistent reverse-geocode cache shared by every process that extracts metadata.
+
+extract caches the final location it resolves for a point (offline
+gazetteer result, or the Nominatim address that replaced it), so a hit
+skips both lookups. Coordinates are quantized to GEOCODE_CACHE_PRECISION
+decimal places (3 -> ~110 m cells), so photos taken around the same spot
+share one entry.
+Successful lookups live for GEOCODE_CACHE_TTL seconds; failed, timed-out
+and empty lookups are cached too, for the shorter GEOCODE_CACHE_NEGATIVE_TTL,
+so an unreachable or rate-limiting service is not hammered. The table is
+kept under GEOCODE_CACHE_MAX_ENTRIES by evicting least recently used rows.
+
+The default file sits next to this module, so the face service (which
+imports extract from here) and the metadata CLI use the same cache.
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+
+GEOCODE_CACHE_PATH = os.getenv("GEOCODE_CACHE_PATH",
+                               os.path.join(os.path.dirname(os.path.abspath(__file__)), "geocode_cache.sqlite"))
+# Decimal places kept of latitude/longitude in the cache key
+GEOCODE_CACHE_PRECISION = int(os.getenv("GEOCODE_CACHE_PRECISION", "3"))
+# Seconds a result / a failed lookup stays valid
+GEOCODE_CACHE_TTL = float(os.getenv("GEOCODE_CACHE_TTL", str(30 * 24 * 3600)))
+GEOCODE_CACHE_NEGATIVE_TTL = float(os.getenv("GEOCODE_CACHE_NEGATIVE_TTL", "3600"))
+# Most rows kept (0 disables the cache)
+GEOCODE_CACHE_MAX_ENTRIES = int(os.getenv("GEOCODE_CACHE_MAX_ENTRIES", "100000"))
+# Writes between two eviction passes
+EVICT_EVERY = 256
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS geocodes (
+    tier TEXT NOT NULL,
+    lat_q INTEGER NOT NULL,
+    lon_q INTEGER NOT NULL,
+    precision INTEGER NOT NULL,
+    result TEXT,
+    expires REAL NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (tier, lat_q, lon_q, precision)
+)
+"""
+_INDEX = "CREATE INDEX IF NOT EXISTS geocodes_last_used ON geocodes (last_used)"
+
+
+class GeocodeCache:
+    """
+    SQLite-backed map from (tier, quantized lat/lon) to a reverse-geocode result.
+
+    get() returns (found, result); result is None for a cached failure.
+    tier names the lookup that produced the result (e.g. "resolved-fallback")
+    so different geocoders never share entries. One connection is shared by
+    the threads of a process behind a lock.
+    """
+
+    def __init__(self, path=GEOCODE_CACHE_PATH, precision=GEOCODE_CACHE_PRECISION, ttl=GEOCODE_CACHE_TTL,
+                 negative_ttl=GEOCODE_CACHE_NEGATIVE_TTL, max_entries=GEOCODE_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.precision = precision
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._scale = 10 ** precision
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._stats = {"hits": 0, "negative_hits": 0, "misses": 0, "expired": 0, "evicted": 0}
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(_SCHEMA)
+        self._conn.execute(_INDEX)
+        self._conn.commit()
+
+    def _key(self, tier, latitude, longitude):
+        return tier, int(round(latitude * self._scale)), int(round(longitude * self._scale)), self.precision
+
+    def get(self, tier, latitude, longitude):
+        key = self._key(tier, latitude, longitude)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result, expires FROM geocodes WHERE tier = ? AND lat_q = ? AND lon_q = ? AND precision = ?",
+                key,
+            ).fetchone()
+            if row is not None and row[1] < now:
+                self._stats["expired"] += 1
+                row = None
+            if row is None:
+                self._stats["misses"] += 1
+                return False, None
+            with self._conn:
+                self._conn.execute(
+                    "UPDATE geocodes SET last_used = ? WHERE tier = ? AND lat_q = ? AND lon_q = ? AND precision = ?",
+                    (now,) + key,
+                )
+            if row[0] is None:
+                self._stats["negative_hits"] += 1
+                return True, None
+            self._stats["hits"] += 1
+            return True, json.loads(row[0])
+
+    def put(self, tier, latitude, longitude, result, ttl=None):
+        """Store a result, or None for a failed lookup (kept for negative_ttl unless ttl is given)."""
+        now = time.time()
+        if ttl is None:
+            ttl = self.ttl if result is not None else self.negative_ttl
+        value = None if result is None else json.dumps(result, ensure_ascii=False)
+        with self._lock:
+            with self._conn:
+                self._conn.execute("INSERT OR REPLACE INTO geocodes VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                   self._key(tier, latitude, longitude) + (value, now + ttl, now))
+            self._writes += 1
+            if self._writes % EVICT_EVERY == 0:
+                self._evict(now)
+
+    def _evict(self, now):
+        with self._conn:
+            removed = self._conn.execute("DELETE FROM geocodes WHERE expires < ?", (now,)).rowcount
+            excess = self._conn.execute("SELECT COUNT(*) FROM geocodes").fetchone()[0] - self.max_entries
+            if excess > 0:
+                removed += self._conn.execute(
+                    "DELETE FROM geocodes WHERE rowid IN (SELECT rowid FROM geocodes ORDER BY last_used LIMIT ?)",
+                    (excess,),
+                ).rowcount
+        self._stats["evicted"] += removed
+
+    def evict(self):
+        """Drop expired rows and trim the table to max_entries now."""
+        with self._lock:
+            self._evict(time.time())
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM geocodes").fetchone()[0]
+
+    def metrics(self):
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["negative_hits"] + stats["misses"]
+        stats.update({
+            "path": self.path,
+            "precision": self.precision,
+            "hit_rate": round((stats["hits"] + stats["negative_hits"]) / lookups, 4) if lookups else 0.0,
+        })
+        return stats
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_cache = None
+_cache_pid = None
+_cache_lock = threading.Lock()
+
+
+def get_geocode_cache():
+    """
+    Return the process-wide geocode cache, opening it on first use.
+
+    Returns None when the cache is disabled or cannot be opened. SQLite
+    connections must not cross fork(), so a forked worker opens its own.
+    """
+    global _cache, _cache_pid
+    if GEOCODE_CACHE_MAX_ENTRIES <= 0:
+        return None
+    if _cache_pid != os.getpid():
+        with _cache_lock:
+            if _cache_pid != os.getpid():
+                try:
+                    _cache = GeocodeCache()
+                except sqlite3.Error as e:
+                    print(f"[WARN] Geocode cache unavailable ({GEOCODE_CACHE_PATH}): {e}")
+                    _cache = None
+                _cache_pid = os.getpid()
+    return _cache
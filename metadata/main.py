@@ -1,33 +1,56 @@
-from extract import get_image_metadata
-import json
+from extract import get_image_metadata_lazy
+import argparse
 import sys
 
-# Get file path from command line argument or prompt user
-file_path = "one.jpg"
 
-# Get metadata as JSON string using file handle
-with open(file_path, 'rb') as f:
-    json_string = get_image_metadata(f)
-print(json_string)
+def show_metadata(file_path):
+    # Get metadata using file handle; printing serializes it to JSON
+    with open(file_path, 'rb') as f:
+        result = get_image_metadata_lazy(f)
+    print(result)
 
-# Parse JSON to access specific fields
-metadata = json.loads(json_string)
+    metadata = result.data
 
-# Safely access location data
-location = metadata.get('location')
-if isinstance(location, dict):
-    location_name = location.get('location_name', {})
-    if isinstance(location_name, dict):
-        city = location_name.get('city', 'Not available')
+    # Safely access location data
+    location = metadata.get('location')
+    if isinstance(location, dict):
+        location_name = location.get('location_name', {})
+        if isinstance(location_name, dict):
+            city = location_name.get('city', 'Not available')
+        else:
+            city = 'Not available'
     else:
         city = 'Not available'
-else:
-    city = 'Not available'
 
-print(f"City: {city}")
-print(f"Time taken: {metadata.get('time_taken', 'Not available')}")
+    print(f"City: {city}")
+    print(f"Time taken: {metadata.get('time_taken', 'Not available')}")
 
-# Safely access camera data
-make = metadata.get('Make', 'Unknown')
-model = metadata.get('Model', 'Unknown')
-print(f"Camera: {make} {model}")
\ No newline at end of file
+    # Safely access camera data
+    make = metadata.get('Make', 'Unknown')
+    model = metadata.get('Model', 'Unknown')
+    print(f"Camera: {make} {model}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract location, time and camera metadata from images.")
+    parser.add_argument("inputs", nargs="*", default=["one.jpg"],
+                        help="Image to inspect; with --bulk, any mix of directories, zip/tar archives and images")
+    parser.add_argument("--bulk", action="store_true", help="Sweep all inputs into a JSON Lines/Parquet output")
+    parser.add_argument("--output", default="metadata.jsonl",
+                        help="JSON Lines file to append to, or a directory for --format parquet")
+    parser.add_argument("--format", choices=["jsonl", "parquet"], default=None,
+                        help="Output format (default: from the output name)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--manifest", default=None,
+                        help="Processed-files list used to resume (default: <output>.manifest)")
+    args = parser.parse_args()
+
+    if args.bulk:
+        from bulk_extract import run_bulk
+        try:
+            run_bulk(args.inputs, args.output, args.format, args.workers, args.manifest)
+        except ImportError as e:
+            print(e)
+            sys.exit(1)
+    else:
+        show_metadata(args.inputs[0])
@@ -2,6 +2,9 @@ const OSINTService = require('../services/osintService');
 
 const osintService = new OSINTService();
 
+// Most names accepted by one bulk search (matches FACE_MAX_FACES in the face service)
+const MAX_BULK_NAMES = parseInt(process.env.MAX_BULK_NAMES || '20', 10);
+
 // GET handler (existing)
 exports.searchPerson = async (req, res) => {
   try {
@@ -64,6 +67,50 @@ exports.searchPersonPost = async (req, res) => {
   }
 };
 
+// Bulk search: one request for every person identified in a group photo
+exports.bulkSearch = async (req, res) => {
+  try {
+    const { names, location, metadata } = req.body;
+
+    if (!Array.isArray(names) || names.length === 0) {
+      return res.status(400).json({ error: 'names must be a non-empty array' });
+    }
+
+    if (names.length > MAX_BULK_NAMES) {
+      return res.status(400).json({ error: `At most ${MAX_BULK_NAMES} names per request` });
+    }
+
+    if (names.some(name => typeof name !== 'string' || !name || name.length > 100)) {
+      return res.status(400).json({ error: 'Every name must be a non-empty string of at most 100 characters' });
+    }
+
+    if (location && location.length > 100) {
+      return res.status(400).json({ error: 'Location too long' });
+    }
+
+    const uniqueNames = [...new Set(names)];
+    const settled = await Promise.allSettled(
+      uniqueNames.map(name => osintService.generateReport(name, location, undefined, metadata))
+    );
+
+    const results = uniqueNames.map((name, i) => {
+      const outcome = settled[i];
+      if (outcome.status === 'rejected') {
+        return { name, error: outcome.reason && outcome.reason.message ? outcome.reason.message : 'Search failed' };
+      }
+      if (outcome.value && outcome.value.error) {
+        return { name, error: outcome.value.error };
+      }
+      return { name, report: outcome.value };
+    });
+
+    res.json({ location: location || '', metadata: metadata || null, results });
+  } catch (error) {
+    console.error('Bulk Search Controller Error:', error);
+    res.status(500).json({ error: 'Internal server error' });
+  }
+};
+
 exports.advancedSearch = async (req, res) => {
   try {
     const { name, location, email, phone, domain, options } = req.body;
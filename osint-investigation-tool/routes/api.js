@@ -14,6 +14,7 @@ router.use(auth.requestLogger);
 router.get('/search', auth.verifyApiKey, searchController.searchPerson);
 router.post('/search', auth.verifyApiKey, searchController.searchPersonPost); // NEW: POST endpoint
 router.post('/search/advanced', auth.verifyApiKey, searchController.advancedSearch);
+router.post('/search/bulk', auth.verifyApiKey, searchController.bulkSearch); // One call for every face in a group photo
 
 // Overall/Complete report endpoint (formatted)
 router.post('/overall', auth.verifyApiKey, searchController.searchPersonPost); // Same as search, returns formatted report
@@ -56,6 +57,15 @@ router.get('/docs', (req, res) => {
           main_id: 'Optional. Add to an existing report with this main_id'
         }
       },
+      '/api/search/bulk': {
+        method: 'POST',
+        description: 'Search for several people at once (e.g. every face identified in a group photo)',
+        parameters: {
+          names: 'Required. Array of names to search for (duplicates are searched once)',
+          location: 'Optional. The location to narrow down the search',
+          metadata: 'Optional. Image metadata attached to every report'
+        }
+      },
       '/api/search/advanced': {
         method: 'POST',
         description: 'Advanced search with multiple parameters',